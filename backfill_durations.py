@@ -0,0 +1,63 @@
+"""
+One-off backfill of call_duration_s / speaking_seconds_per_speaker for calls
+uploaded before upload_jsons_to_firestore.py started storing them.
+
+Reads only the speaking-time fields, parses every call's "MM:SS" values in
+one vectorized pass, writes the results back in batches and then rebuilds
+the daily rollups and the call buckets so their duration sums and packed
+calls pick the new values up.
+"""
+import pandas as pd
+import firebase_admin
+from firebase_admin import credentials, firestore
+
+from call_buckets import rebuild_all_buckets
+from durations import call_durations, speaker_seconds
+from rollups import rebuild_all_rollups
+
+# --- CONFIGURATION ---
+firebase_key_path = "/Users/Chloe/Downloads/valence-acsi-dashboard-firebase-adminsdk-fbsvc-e8065d1b80.json"
+collection_name = "calls"
+batch_size = 500   # Firestore's per-batch write limit
+
+# --- INITIALIZE FIREBASE ---
+print("✅ Initializing Firebase...")
+if not firebase_admin._apps:
+    cred = credentials.Certificate(firebase_key_path)
+    firebase_admin.initialize_app(cred)
+db = firestore.client()
+coll = db.collection(collection_name)
+
+# --- FIND CALLS WITHOUT A STORED DURATION ---
+print("✅ Scanning speaking times...")
+speaking_maps = {}
+for doc in coll.select(["speaking_time_per_speaker", "call_duration_s"]).stream():
+    data = doc.to_dict()
+    if "call_duration_s" not in data:
+        speaking_maps[doc.id] = data.get("speaking_time_per_speaker")
+print(f"🔍 {len(speaking_maps)} calls need a duration.")
+
+# --- PARSE (VECTORIZED) & WRITE BACK ---
+maps = pd.Series(speaking_maps, dtype=object)
+durations = call_durations(maps)
+
+updated_count = 0
+batch = db.batch()
+for doc_id, speaking in maps.items():
+    duration = durations[doc_id]
+    batch.update(coll.document(doc_id), {
+        "call_duration_s": None if pd.isna(duration) else int(duration),
+        "speaking_seconds_per_speaker": speaker_seconds(speaking),
+        # Bump the sync mark so running dashboards pick the change up
+        "ingested_at": firestore.SERVER_TIMESTAMP,
+    })
+    updated_count += 1
+    if updated_count % batch_size == 0:
+        batch.commit()
+        batch = db.batch()
+        print(f"✅ Updated {updated_count} calls...")
+batch.commit()
+
+print(f"✅ Rebuilt {rebuild_all_rollups(db)} rollups.")
+print(f"✅ Repacked {rebuild_all_buckets(db)} call buckets.")
+print(f"🎉 Backfill complete: {updated_count} calls updated.")
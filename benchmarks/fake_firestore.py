@@ -0,0 +1,248 @@
+"""
+In-process stand-in for the parts of the Firestore client the dashboard
+and the uploader use, so the pipeline can be driven without credentials.
+
+Supports collection/document get, set, update and delete; where() with
+==, <, <=, >, >= and in; order_by, select, start_after, limit, stream and
+count(); and write batches. SERVER_TIMESTAMP is replaced with a strictly
+increasing UTC timestamp, as Firestore's commit times are. A query's
+matches are computed once and shared by all its pages until the next
+write, so paging through a million documents stays linear. Document reads
+are counted in `reads` the way Firestore bills them (one per document
+returned, one per 1,000 matches counted).
+"""
+import math
+import operator
+import time
+from datetime import datetime, timezone
+
+from google.cloud.firestore_v1 import SERVER_TIMESTAMP
+
+_OPS = {
+    "==": operator.eq,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "in": lambda value, options: value in options,
+}
+
+
+def _stored(value):
+    # Firestore hands datetimes back timezone-aware, in UTC
+    if isinstance(value, datetime) and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+class FakeSnapshot:
+
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+    def get(self, field):
+        return self._data[field]
+
+
+class FakeDocument:
+
+    def __init__(self, collection, doc_id):
+        self.collection = collection
+        self.id = doc_id
+
+    def set(self, payload, merge=False):
+        self.collection._write(self.id, payload, merge=merge)
+
+    def update(self, fields):
+        if self.id not in self.collection.docs:
+            raise KeyError(f"No document to update: {self.id}")
+        self.collection._write(self.id, fields, merge=True)
+
+    def delete(self):
+        self.collection._delete(self.id)
+
+    def get(self, field_paths=None):
+        self.collection.client.reads += 1
+        data = self.collection.docs.get(self.id)
+        if data is not None and field_paths is not None:
+            data = {f: data[f] for f in field_paths if f in data}
+        return FakeSnapshot(self, data)
+
+
+class _Count:
+
+    def __init__(self, value):
+        self.value = value
+
+
+class _CountQuery:
+
+    def __init__(self, query):
+        self.query = query
+
+    def get(self):
+        # Same shape as an aggregation result: [[AggregationResult]]
+        count = len(self.query._matches())
+        self.query.collection.client.reads += max(1, math.ceil(count / 1000))
+        return [[_Count(count)]]
+
+
+class FakeQuery:
+
+    def __init__(self, collection, filters=(), order=None, fields=None, after=None, limit=None):
+        self.collection = collection
+        self.filters = tuple(filters)
+        self.order = order
+        self.fields = fields
+        self.after = after
+        self._limit = limit
+
+    def _copy(self, **changes):
+        state = dict(filters=self.filters, order=self.order, fields=self.fields,
+                     after=self.after, limit=self._limit)
+        state.update(changes)
+        return FakeQuery(self.collection, **state)
+
+    def where(self, field_path=None, op_string=None, value=None, *, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        if isinstance(value, (list, set)):
+            value = tuple(value)
+        return self._copy(filters=self.filters + ((field_path, op_string, value),))
+
+    def order_by(self, field_path, direction=None):
+        return self._copy(order=field_path)
+
+    def select(self, field_paths):
+        return self._copy(fields=tuple(field_paths))
+
+    def start_after(self, snapshot):
+        return self._copy(after=snapshot.id)
+
+    def limit(self, count):
+        return self._copy(limit=count)
+
+    def count(self):
+        return _CountQuery(self)
+
+    def _matches(self):
+        """
+        Matching document IDs in query order (ignoring cursor and limit).
+        """
+        return self.collection._matching(self.filters, self.order)[0]
+
+    def stream(self):
+        ids, positions = self.collection._matching(self.filters, self.order)
+        start = positions[self.after] + 1 if self.after is not None else 0
+        stop = len(ids) if self._limit is None else start + self._limit
+        docs = self.collection.docs
+        for doc_id in ids[start:stop]:
+            self.collection.client.reads += 1
+            data = docs[doc_id]
+            if self.fields is not None:
+                data = {f: data[f] for f in self.fields if f in data}
+            yield FakeSnapshot(FakeDocument(self.collection, doc_id), data)
+
+    def get(self):
+        return list(self.stream())
+
+
+class FakeCollection(FakeQuery):
+
+    def __init__(self, client, name):
+        super().__init__(self)
+        self.client = client
+        self.name = name
+        self.docs = {}
+        # (filters, order) → (matching IDs in order, {ID: position})
+        self._query_cache = {}
+
+    def document(self, doc_id):
+        return FakeDocument(self, doc_id)
+
+    def _write(self, doc_id, payload, merge=False):
+        stored = {}
+        for field, value in payload.items():
+            stored[field] = self.client._server_time() if value is SERVER_TIMESTAMP else _stored(value)
+        if merge and doc_id in self.docs:
+            self.docs[doc_id].update(stored)
+        else:
+            self.docs[doc_id] = stored
+        self._changed()
+
+    def _delete(self, doc_id):
+        if self.docs.pop(doc_id, None) is not None:
+            self._changed()
+
+    def _changed(self):
+        self._query_cache.clear()
+
+    def _matching(self, filters, order):
+        key = (filters, order)
+        cached = self._query_cache.get(key)
+        if cached is not None:
+            return cached
+
+        items = self.docs.items()
+        for field, op, value in filters:
+            compare = _OPS[op]
+            items = [(k, d) for k, d in items if d.get(field) is not None and compare(d[field], value)]
+        if order is not None:
+            # Like Firestore, documents without the ordering field are left out
+            items = [(k, d) for k, d in items if d.get(order) is not None]
+            items = sorted(items, key=lambda kd: (kd[1][order], kd[0]))
+        else:
+            items = sorted(items, key=lambda kd: kd[0])
+
+        ids = [k for k, _ in items]
+        cached = ids, {k: i for i, k in enumerate(ids)}
+        self._query_cache[key] = cached
+        return cached
+
+
+class FakeBatch:
+
+    def __init__(self):
+        self._ops = []
+
+    def set(self, reference, payload, merge=False):
+        self._ops.append((reference.set, (payload, merge)))
+
+    def update(self, reference, fields):
+        self._ops.append((reference.update, (fields,)))
+
+    def delete(self, reference):
+        self._ops.append((reference.delete, ()))
+
+    def commit(self):
+        for op, args in self._ops:
+            op(*args)
+        self._ops = []
+
+
+class FakeFirestore:
+
+    def __init__(self):
+        self._collections = {}
+        self._last_server_time = 0.0
+        self.reads = 0
+
+    def collection(self, name):
+        if name not in self._collections:
+            self._collections[name] = FakeCollection(self, name)
+        return self._collections[name]
+
+    def batch(self):
+        return FakeBatch()
+
+    def _server_time(self):
+        # Commit timestamps never repeat, so '>' on them is a safe cursor
+        now = max(time.time(), self._last_server_time + 1e-6)
+        self._last_server_time = now
+        return datetime.fromtimestamp(now, tz=timezone.utc)
@@ -0,0 +1,211 @@
+"""
+Time each stage of the dashboard pipeline on synthetic calls.
+
+    python -m benchmarks.run                          # 10k, 100k and 1M calls
+    python -m benchmarks.run --sizes 10000 100000
+    python -m benchmarks.run --compare benchmarks/results/<earlier>.json
+    python -m benchmarks.run --backend duckdb         # local Parquet + DuckDB
+    python -m benchmarks.run --backend buckets        # packed call buckets
+
+For each size the calls are written (untimed) to an in-process fake
+Firestore, or with --backend duckdb to a temporary Parquet directory read
+through DuckDB, then loaded, normalized, rolled up, indexed and filtered, every
+chart is rendered and PNG-encoded, and the Excel and PDF exports are
+built, each stage timed on its own. The rollups come from the source as the
+dashboard gets them: built from the loaded calls for Firestore, grouped in
+SQL with DuckDB. With --backend buckets the calls are also packed into
+per-company-day buckets (untimed, as the uploader would have) and loaded
+from those. Firestore runs also record every document the load and the
+rollups read.
+Results are written as JSON under
+benchmarks/results/, named after the current commit (and backend), so runs
+from two versions can be compared with --compare.
+"""
+import argparse
+import json
+import platform
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+from benchmarks.fake_firestore import FakeFirestore
+from benchmarks.synthetic_calls import COMPANIES, populate, populate_local
+from call_index import CallIndex
+from call_buckets import rebuild_all_buckets
+from call_store import normalize_calls
+from chart_cache import figure_png
+from charts import CHARTS, rolling_happiness
+from data_sources import FirestoreSource, LocalSource
+from exports import build_excel, build_pdf
+from rolling_kpis import RollingKPIs
+from rollups import filter_rollups
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+BACKENDS = ["firestore", "duckdb", "buckets"]
+RESULTS_DIR = Path(__file__).parent / "results"
+# Changes smaller than this ratio, or in stages faster than MIN_FLAGGED_S
+# either way, are treated as noise
+NOISE_RATIO = 1.2
+MIN_FLAGGED_S = 0.05
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+class StageTimer:
+
+    def __init__(self):
+        self.stages = {}
+
+    def time(self, stage, fn, *args, **kwargs):
+        started = time.perf_counter()
+        result = fn(*args, **kwargs)
+        elapsed = time.perf_counter() - started
+        self.stages[stage] = round(elapsed, 4)
+        print(f"  {stage:<32} {elapsed:8.3f}s")
+        return result
+
+
+def bench_size(n: int, days: int, seed: int, backend: str = "firestore") -> dict:
+    print(f"⏱️ {n:,} calls ({backend})")
+    started = time.perf_counter()
+    if backend == "duckdb":
+        local_dir = tempfile.TemporaryDirectory()
+        source = LocalSource(local_dir.name)
+        populate_local(source, n, days=days, seed=seed)
+    else:
+        client = FakeFirestore()
+        populate(client, n, days=days, seed=seed)
+        if backend == "buckets":
+            rebuild_all_buckets(client)
+        source = FirestoreSource(client, buckets=backend == "buckets")
+    setup_s = round(time.perf_counter() - started, 2)
+
+    timer = StageTimer()
+    reads_before = client.reads if backend != "duckdb" else None
+    records = timer.time("load", source.fetch_calls, page_size=1000)
+    calls = timer.time("normalize", normalize_calls, records)
+    del records
+    rollups = timer.time("rollups", source.fetch_rollups, calls)
+    load_reads = client.reads - reads_before if backend != "duckdb" else None
+    if load_reads is not None:
+        print(f"  {'documents read':<32} {load_reads:8,}")
+    index = timer.time("index", CallIndex, calls)
+
+    end = index.last_day
+    start = end - timedelta(days=29)
+    agents = index.agents.tolist()
+    timer.time("filter:all", index.select, index.first_day, end, COMPANIES, agents)
+    timer.time("filter:last_30_days", index.select, start, end, COMPANIES, agents)
+    one_company = index.agents_for(COMPANIES[:1])
+    timer.time("filter:one_company", index.select, index.first_day, end, COMPANIES[:1], one_company)
+
+    # Charts and exports are measured on the everything-selected view,
+    # the dashboard's default and its heaviest
+    filtered = index.select(index.first_day, end, COMPANIES, agents)
+    filtered_rollups = filter_rollups(rollups, index.first_day, end, COMPANIES, agents)
+
+    def render_rolling(calls, rollups, window_days=7):
+        # As on a dashboard cache miss: a fresh engine, then one window
+        kpis = RollingKPIs(COMPANIES, agents)
+        kpis.update(rollups, version=1)
+        return rolling_happiness(kpis.rolling_happiness(window_days, index.first_day, end), window_days)
+
+    # Rendered one at a time here, so each chart's cost shows on its own
+    charts = []
+    for chart_id, (title, render) in CHARTS.items():
+        if chart_id == "rolling_happiness":
+            render = render_rolling
+        fig = timer.time(f"chart:{chart_id}", render, filtered, filtered_rollups)
+        png = timer.time(f"png:{chart_id}", figure_png, fig)
+        plt.close(fig)
+        charts.append((png, title))
+
+    summary = pd.DataFrame({
+        "Total Calls": [len(filtered)],
+        "Avg Happiness %": [filtered["Avg Happiness %"].mean()],
+    })
+    timer.time("excel", build_excel, filtered, summary, charts)
+    timer.time("pdf", build_pdf, charts)
+    if backend == "duckdb":
+        local_dir.cleanup()
+
+    return {"calls": n, "setup_s": setup_s, "load_reads": load_reads, "stages": timer.stages}
+
+
+def compare(current: dict, baseline: dict):
+    """
+    Print each stage's change against an earlier results file.
+    """
+    print(f"\n📊 Against {baseline.get('commit') or 'baseline'} ({baseline['generated_at']}):")
+    if baseline.get("backend", "firestore") != current["backend"]:
+        print(f"⚠️ Baseline used the {baseline.get('backend', 'firestore')} backend, this run {current['backend']}")
+    earlier = {run["calls"]: run["stages"] for run in baseline["runs"]}
+    for run in current["runs"]:
+        before = earlier.get(run["calls"])
+        if before is None:
+            continue
+        print(f"  {run['calls']:,} calls")
+        for stage, seconds in run["stages"].items():
+            if stage not in before or not before[stage]:
+                continue
+            ratio = seconds / before[stage]
+            flag = "  "
+            if max(seconds, before[stage]) >= MIN_FLAGGED_S:
+                flag = "⚠️" if ratio > NOISE_RATIO else ("✅" if ratio < 1 / NOISE_RATIO else "  ")
+            print(f"  {flag} {stage:<32} {before[stage]:8.3f}s → {seconds:8.3f}s ({ratio:.2f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--days", type=int, default=365, help="days the calls are spread over")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--backend", choices=BACKENDS, default="firestore", help="where the calls are loaded from")
+    parser.add_argument("--output", type=Path, help="results file (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", type=Path, help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    commit = _commit()
+    results = {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "commit": commit,
+        "backend": args.backend,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "versions": {"pandas": pd.__version__, "numpy": np.__version__, "matplotlib": matplotlib.__version__},
+        "runs": [bench_size(n, args.days, args.seed, args.backend) for n in args.sizes],
+    }
+
+    name = commit or datetime.now().strftime("%Y%m%d-%H%M%S")
+    if args.backend != "firestore":
+        name += f"-{args.backend}"
+    output = args.output or RESULTS_DIR / f"{name}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"📄 Results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Synthetic call JSONs shaped like the Valence exports, for benchmarks.
+
+Calls are spread over the last `days` days across Quantum, StVincent and
+ABCMotors and a fixed roster of agents per company. Each agent has their
+own happiness baseline, speaking times are "MM:SS" strings and emotion
+counts scale with call length, so the charts look like real data rather
+than noise. Documents go through the uploader's build_payload, so what
+lands in the fake Firestore (or a local Parquet directory) has exactly the
+uploaded shape.
+"""
+from datetime import date, timedelta
+
+import numpy as np
+from firebase_admin import firestore
+
+from call_store import collection_name
+from upload_jsons_to_firestore import build_payload
+
+COMPANIES = ["Quantum", "StVincent", "ABCMotors"]
+COMPANY_SHARE = [0.5, 0.3, 0.2]
+AGENTS_PER_COMPANY = 20
+TIMES_OF_DAY = ["Morning", "Afternoon", "Evening"]
+TIME_SHARE = [0.4, 0.4, 0.2]
+
+# One emotion reading roughly every this many seconds of call
+SECONDS_PER_READING = 10
+_CHUNK = 10_000
+
+
+def _mmss(seconds: int) -> str:
+    return f"{seconds // 60:02d}:{seconds % 60:02d}"
+
+
+def synthetic_calls(n: int, days: int = 365, end: date = None, seed: int = 0, graph_points: int = 20):
+    """
+    Yield `n` call JSONs (as parsed dicts) like the ones in an export ZIP.
+    """
+    rng = np.random.default_rng(seed)
+    end = end or date.today()
+    agent_ids = [
+        [f"{1000 * (c + 1) + a}" for a in range(AGENTS_PER_COMPANY)] for c in range(len(COMPANIES))
+    ]
+    # Per-agent share of happy readings, so leaderboards have a spread
+    agent_mood = rng.beta(4, 3, size=(len(COMPANIES), AGENTS_PER_COMPANY))
+
+    for offset in range(0, n, _CHUNK):
+        m = min(_CHUNK, n - offset)
+        company = rng.choice(len(COMPANIES), m, p=COMPANY_SHARE)
+        agent = rng.integers(0, AGENTS_PER_COMPANY, m)
+        day = rng.integers(0, days, m)
+        time_of_day = rng.choice(len(TIMES_OF_DAY), m, p=TIME_SHARE)
+        agent_s = rng.lognormal(np.log(150), 0.6, m).astype(int).clip(5, 3599)
+        customer_s = rng.lognormal(np.log(120), 0.7, m).astype(int).clip(5, 3599)
+        low_confidences = rng.poisson(2, m)
+
+        readings = np.maximum((agent_s + customer_s) // SECONDS_PER_READING, 1)
+        mood = agent_mood[company, agent]
+        happy = rng.binomial(readings, mood)
+        angry = rng.binomial(readings - happy, 0.25)
+        sad = rng.binomial(readings - happy - angry, 1 / 3)
+        neutral = readings - happy - angry - sad
+
+        for i in range(m):
+            call_date = end - timedelta(days=int(day[i]))
+            length = int(agent_s[i] + customer_s[i])
+            x = np.linspace(0, length, graph_points)
+            y = np.clip(mood[i] + rng.normal(0, 0.15, graph_points).cumsum() / 4, 0, 1)
+            yield {
+                "metadata": {
+                    "call_id": f"call-{offset + i:08d}",
+                    "agent": agent_ids[company[i]][agent[i]],
+                    "company": COMPANIES[company[i]],
+                    "time": TIMES_OF_DAY[time_of_day[i]],
+                    "date": call_date.strftime("%m%d%Y"),
+                    "low_confidences": int(low_confidences[i]),
+                },
+                "average_happiness_value": float(y.mean()),
+                "emotion_counts": {
+                    "happy": int(happy[i]),
+                    "angry": int(angry[i]),
+                    "sad": int(sad[i]),
+                    "neutral": int(neutral[i]),
+                },
+                "speaking_time_per_speaker": {
+                    "Agent": _mmss(int(agent_s[i])),
+                    "Customer": _mmss(int(customer_s[i])),
+                },
+                "emotion_graph": [{"x": float(a), "y": float(b)} for a, b in zip(x, y)],
+            }
+
+
+def populate(client, n: int, **kwargs) -> int:
+    """
+    Write `n` synthetic calls to the client's calls collection as the
+    uploader would, ingest timestamp included. Returns the number written.
+    """
+    coll = client.collection(collection_name)
+    written = 0
+    for data in synthetic_calls(n, **kwargs):
+        payload = build_payload(data, data["metadata"]["call_id"])
+        payload["ingested_at"] = firestore.SERVER_TIMESTAMP
+        coll.document(payload["call_id"]).set(payload)
+        written += 1
+    return written
+
+
+def populate_local(source, n: int, **kwargs) -> int:
+    """
+    Write `n` synthetic calls to a data_sources.LocalSource, one Parquet
+    file per chunk. Returns the number written.
+    """
+    written = 0
+    chunk = []
+    for data in synthetic_calls(n, **kwargs):
+        chunk.append(build_payload(data, data["metadata"]["call_id"]))
+        if len(chunk) >= _CHUNK:
+            written += source.write_calls(chunk)
+            chunk = []
+    return written + source.write_calls(chunk)
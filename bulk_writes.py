@@ -0,0 +1,139 @@
+"""
+Batched, concurrent Firestore writes with retry and backoff on contention.
+"""
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+from google.api_core import exceptions
+
+# Firestore's per-batch write limit
+MAX_BATCH_OPS = 500
+# A commit request is capped at 10 MiB; call documents with packed graphs and
+# call buckets run to hundreds of KB each, so 500 of them would be far over.
+# The margin covers what payload_bytes doesn't count exactly.
+MAX_BATCH_BYTES = 9 * 1024 * 1024
+# Document name and request framing, per write
+WRITE_OVERHEAD_BYTES = 1024
+
+# Contention and transient backend errors; anything else won't go away on retry
+RETRYABLE = (
+    exceptions.Aborted,
+    exceptions.DeadlineExceeded,
+    exceptions.InternalServerError,
+    exceptions.ResourceExhausted,
+    exceptions.ServiceUnavailable,
+)
+
+
+def commit_with_retry(client, writes, max_attempts: int = 5, base_delay: float = 0.5):
+    """
+    Commit (ref, payload) writes as one batch (payload None = delete),
+    retrying retryable errors with jittered exponential backoff.
+    """
+    for attempt in range(1, max_attempts + 1):
+        batch = client.batch()
+        for ref, payload in writes:
+            if payload is None:
+                batch.delete(ref)
+            else:
+                batch.set(ref, payload)
+        try:
+            batch.commit()
+            return
+        except RETRYABLE:
+            if attempt == max_attempts:
+                raise
+            time.sleep(base_delay * 2 ** (attempt - 1) * (1 + random.random()))
+
+
+def payload_bytes(value) -> int:
+    """
+    Rough encoded size of a document payload (or any value in one), after
+    Firestore's storage size rules: strings and blobs by length, names
+    included, numbers and timestamps 8 bytes.
+    """
+    if isinstance(value, dict):
+        return sum(len(str(k).encode("utf-8")) + 1 + payload_bytes(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(payload_bytes(v) for v in value)
+    if isinstance(value, str):
+        return len(value.encode("utf-8")) + 1
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    if value is None or isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float, datetime)):
+        return 8
+    # Sentinels (SERVER_TIMESTAMP) and anything else small
+    return 16
+
+
+def _chunks(writes, batch_size, max_bytes):
+    """
+    Split writes into batches of at most `batch_size` writes and
+    `max_bytes` (one write over the byte budget still gets a batch of its own).
+    """
+    chunk, chunk_bytes = [], 0
+    for write in writes:
+        size = WRITE_OVERHEAD_BYTES + payload_bytes(write[2])
+        if chunk and (len(chunk) >= batch_size or chunk_bytes + size > max_bytes):
+            yield chunk
+            chunk, chunk_bytes = [], 0
+        chunk.append(write)
+        chunk_bytes += size
+    if chunk:
+        yield chunk
+
+
+def bulk_write(
+    client,
+    writes,
+    batch_size: int = MAX_BATCH_OPS,
+    max_workers: int = 8,
+    on_commit=None,
+    max_bytes: int = MAX_BATCH_BYTES,
+):
+    """
+    Commit (key, ref, payload) writes in batches of at most `batch_size`
+    writes and about `max_bytes`, at most `max_workers` batches in flight
+    at once.
+
+    A batch that still fails after its retries is replayed one document at a
+    time so the error lands on the document that caused it. Returns
+    [(key, reason)] for every write that didn't make it. `on_commit(keys)`
+    is called from the calling thread with the keys of each committed batch.
+    """
+    chunks = list(_chunks(writes, batch_size, max_bytes))
+    failures = []
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {
+            pool.submit(commit_with_retry, client, [(ref, payload) for _, ref, payload in chunk]): chunk
+            for chunk in chunks
+        }
+        for future in as_completed(futures):
+            chunk = futures[future]
+            try:
+                future.result()
+                committed = [key for key, _, _ in chunk]
+            except Exception:
+                chunk_failures = _write_one_by_one(client, chunk)
+                failures.extend(chunk_failures)
+                failed = {key for key, _ in chunk_failures}
+                committed = [key for key, _, _ in chunk if key not in failed]
+            if on_commit is not None and committed:
+                on_commit(committed)
+
+    return failures
+
+
+def _write_one_by_one(client, chunk):
+    failures = []
+    for key, ref, payload in chunk:
+        try:
+            commit_with_retry(client, [(ref, payload)])
+        except Exception as e:
+            failures.append((key, f"Firestore error: {e}"))
+    return failures
@@ -0,0 +1,283 @@
+"""
+Packed call buckets: all of a company's calls for one day in one document.
+
+Reading `calls` costs one document read per call, so a full dashboard load
+grows with the whole call history. The uploader also keeps one bucket per
+company and day in `call_buckets`, holding that day's calls (the fields
+fetch_calls reads, see call_store.PROJECTION) as one zstd-compressed
+Arrow IPC stream (columnar, and smaller and quicker to open than Parquet at
+this size). Loading from the buckets takes one read per company-day: a few
+hundred for a year of calls instead of one per call.
+
+A day too big for one document (Firestore caps them at 1 MiB) is split
+over as many parts as it takes, `<company>|<YYYYMMDD>|<part>`.
+
+upload_jsons_to_firestore.py repacks every company-day it touches, from the
+same reads that refresh the day's rollups. Run this module directly to pack
+every call already in Firestore.
+"""
+import math
+import operator
+from datetime import datetime, time, timezone
+
+import numpy as np
+import pandas as pd
+from google.cloud.firestore_v1 import SERVER_TIMESTAMP
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+from bulk_writes import bulk_write
+from call_store import PROJECTION, SYNC_FIELD, fetch_calls
+
+bucket_collection = "call_buckets"
+firebase_key_path = "/Users/Chloe/Downloads/valence-acsi-dashboard-firebase-adminsdk-fbsvc-e8065d1b80.json"
+
+# Bump whenever the packed layout changes; the dashboard refuses buckets in
+# another format rather than misreading them
+BUCKET_FORMAT = 1
+PACKED_FIELD = "calls_arrow"
+# Server timestamp of the bucket's last write; stands in for its calls'
+# ingested_at (see fetch_bucketed_calls)
+PACKED_AT_FIELD = "packed_at"
+# Firestore's limit is 1 MiB per document, field names and the other
+# fields included
+MAX_PACKED_BYTES = 1_000_000
+
+# ingested_at isn't stored: it's the bucket's packed_at on the way out
+PACKED_FIELDS = [f for f in PROJECTION if f != SYNC_FIELD]
+_TIMESTAMP_FIELDS = {"call_date", SYNC_FIELD}
+
+_OPS = {
+    "==": operator.eq,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+# A call_date predicate → the bucket `day` predicate every matching call's
+# bucket satisfies; lower bounds are floored to the day's midnight
+_DAY_FILTERS = {
+    "==": ("==", True),
+    ">": (">=", True),
+    ">=": (">=", True),
+    "<": ("<", False),
+    "<=": ("<=", False),
+}
+
+
+def _packed_schema():
+    import pyarrow as pa
+
+    types = {
+        np.float64: pa.float64(),
+        np.int64: pa.int64(),
+    }
+    fields = []
+    for field in PACKED_FIELDS:
+        if field in _TIMESTAMP_FIELDS:
+            fields.append(pa.field(field, pa.timestamp("us", tz="UTC")))
+        else:
+            fields.append(pa.field(field, types.get(PROJECTION[field][0], pa.string())))
+    return pa.schema(fields)
+
+
+def _encode(table) -> bytes:
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+
+    buffer = pa.BufferOutputStream()
+    options = ipc.IpcWriteOptions(compression="zstd")
+    with ipc.new_stream(buffer, table.schema, options=options) as writer:
+        writer.write_table(table)
+    return buffer.getvalue().to_pybytes()
+
+
+def pack_calls(calls: pd.DataFrame) -> list:
+    """
+    Encode a fetch_calls frame as [(rows, blob)], in as few parts as keep
+    every blob within MAX_PACKED_BYTES.
+    """
+    import pyarrow as pa
+
+    frame = calls[PACKED_FIELDS].copy()
+    for field in PACKED_FIELDS:
+        if field not in _TIMESTAMP_FIELDS and PROJECTION[field][0] is object:
+            # Agent IDs and the like may have been uploaded as numbers
+            frame[field] = frame[field].map(lambda v: None if v is None else str(v))
+    table = pa.Table.from_pandas(frame, schema=_packed_schema(), preserve_index=False)
+    if table.num_rows == 0:
+        return []
+
+    parts = 1
+    while True:
+        rows = math.ceil(table.num_rows / parts)
+        blobs = [_encode(table.slice(i, rows)) for i in range(0, table.num_rows, rows)]
+        largest = max(len(blob) for blob in blobs)
+        if largest <= MAX_PACKED_BYTES:
+            return [(min(rows, table.num_rows - i * rows), blob) for i, blob in enumerate(blobs)]
+        if rows == 1:
+            raise ValueError(f"A single call packs to {largest} bytes, over MAX_PACKED_BYTES")
+        parts = max(parts + 1, math.ceil(parts * largest / MAX_PACKED_BYTES))
+
+
+def _document_id(company, day, part) -> str:
+    # '/' would be read as a path separator in a document ID
+    return "|".join(str(p).replace("/", "_") for p in (company, day.strftime("%Y%m%d"), part))
+
+
+def bucket_documents(calls: pd.DataFrame) -> dict:
+    """
+    {document_id: payload} packing a fetch_calls frame by company and day.
+    Calls without a company or a call_date aren't bucketed, as a full load
+    from `calls` (ordered by call_date) leaves them out too.
+    """
+    days = calls["call_date"].dt.floor("D")
+    dated = calls["company"].notna() & days.notna()
+    calls = calls[dated].assign(_day=days[dated])
+    docs = {}
+    for (company, day), group in calls.groupby(["company", "_day"], sort=True):
+        for part, (rows, blob) in enumerate(pack_calls(group)):
+            docs[_document_id(company, day, part)] = {
+                "company": str(company),
+                "day": day.to_pydatetime(),
+                "part": part,
+                "calls": rows,
+                "format": BUCKET_FORMAT,
+                PACKED_FIELD: blob,
+                PACKED_AT_FIELD: SERVER_TIMESTAMP,
+            }
+    return docs
+
+
+def _unpack(buckets):
+    """
+    One frame typed like fetch_calls' from (packed_at, blob) pairs, each
+    bucket's calls stamped with its packed_at as their ingested_at.
+    """
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+
+    tables = [ipc.open_stream(pa.BufferReader(blob)).read_all() for _, blob in buckets]
+    table = pa.concat_tables(tables) if tables else _packed_schema().empty_table()
+    data = {}
+    for field, (dtype, _) in PROJECTION.items():
+        if field == SYNC_FIELD:
+            packed_at = [packed_at for packed_at, _ in buckets]
+            rows = [t.num_rows for t in tables]
+            data[field] = pd.to_datetime(np.repeat(np.array(packed_at, dtype=object), rows), utc=True)
+        elif field in _TIMESTAMP_FIELDS:
+            data[field] = pd.to_datetime(table.column(field).to_pandas(), utc=True)
+        elif dtype is object:
+            data[field] = np.array(table.column(field).to_pylist(), dtype=object)
+        else:
+            data[field] = table.column(field).to_numpy(zero_copy_only=False).astype(dtype)
+    return pd.DataFrame(data)
+
+
+def _day_start(value) -> datetime:
+    value = pd.Timestamp(value)
+    if value.tzinfo is None:
+        value = value.tz_localize("UTC")
+    return value.tz_convert("UTC").floor("D").to_pydatetime()
+
+
+def fetch_bucketed_calls(client, filters=(), order_by: str = "call_date") -> pd.DataFrame:
+    """
+    Same contract as call_store.fetch_calls, read from the buckets: one
+    document read per company-day instead of one per call.
+
+    Filters on company, call_date and ingested_at also pick which buckets
+    are read. A call's ingested_at comes back as its bucket's packed_at,
+    when the dashboard could first read it, so a delta sync (ingested_at
+    after its mark) gets every bucket packed since, whole, even one holding
+    calls uploaded before the mark. Delta syncs merge by Call ID.
+    """
+    if order_by not in PROJECTION:
+        raise ValueError(f"Unknown field to order by: {order_by}")
+    query = client.collection(bucket_collection)
+    for field, op, value in filters:
+        if field == "company" and op in ("==", "in"):
+            query = query.where(filter=FieldFilter("company", op, value))
+        elif field == "call_date" and op in _DAY_FILTERS:
+            day_op, floor = _DAY_FILTERS[op]
+            query = query.where(filter=FieldFilter("day", day_op, _day_start(value) if floor else value))
+        elif field == SYNC_FIELD and op in _OPS:
+            query = query.where(filter=FieldFilter(PACKED_AT_FIELD, op, value))
+
+    buckets = []
+    for snapshot in query.stream():
+        bucket = snapshot.to_dict()
+        if bucket.get("format") != BUCKET_FORMAT:
+            raise ValueError(
+                f"Bucket {snapshot.id} is in format {bucket.get('format')}, not {BUCKET_FORMAT}; "
+                "run `python call_buckets.py` to repack"
+            )
+        buckets.append((bucket[PACKED_AT_FIELD], bucket[PACKED_FIELD]))
+    frame = _unpack(buckets)
+    # A call moved to another day sits in its old bucket too until that one
+    # is repacked; the most recently packed copy is the current one
+    frame = (
+        frame.sort_values(SYNC_FIELD, ascending=False, kind="stable")
+        .drop_duplicates("call_id")
+        .reset_index(drop=True)
+    )
+
+    # The bucket filters only narrow things down to whole days
+    keep = frame[order_by].notna()
+    for field, op, value in filters:
+        if field not in PROJECTION or (op != "in" and op not in _OPS):
+            raise ValueError(f"Unsupported filter: {field} {op}")
+        if op == "in":
+            keep &= frame[field].isin(list(value))
+        else:
+            keep &= _OPS[op](frame[field], value)
+    # Firestore's order: the ordering field, then the document ID
+    return frame[keep].sort_values([order_by, "call_id"], kind="stable").reset_index(drop=True)
+
+
+def _write(client, docs: dict, stale_ids=()):
+    coll = client.collection(bucket_collection)
+    writes = [(doc_id, coll.document(doc_id), payload) for doc_id, payload in docs.items()]
+    writes += [(doc_id, coll.document(doc_id), None) for doc_id in stale_ids]
+    # bulk_write keeps each batch within the commit request size limit
+    failures = bulk_write(client, writes)
+    if failures:
+        raise RuntimeError(f"{len(failures)} bucket writes failed, e.g. {failures[0][0]}: {failures[0][1]}")
+
+
+def replace_buckets(client, company, day, calls: pd.DataFrame) -> int:
+    """
+    Repack one company-day from all its calls (a fetch_calls frame) and
+    drop any parts it no longer needs. Returns the number of parts written.
+    """
+    lower = datetime.combine(day, time.min, tzinfo=timezone.utc)
+    docs = bucket_documents(calls) if len(calls) else {}
+    existing = (
+        client.collection(bucket_collection)
+        .where(filter=FieldFilter("company", "==", company))
+        .where(filter=FieldFilter("day", "==", lower))
+        .select([])
+        .stream()
+    )
+    stale_ids = [d.id for d in existing if d.id not in docs]
+    _write(client, docs, stale_ids)
+    return len(docs)
+
+
+def rebuild_all_buckets(client) -> int:
+    """
+    Repack every call in Firestore, replacing whatever buckets there were.
+    """
+    docs = bucket_documents(fetch_calls(client))
+    existing = client.collection(bucket_collection).select([]).stream()
+    stale_ids = [d.id for d in existing if d.id not in docs]
+    _write(client, docs, stale_ids)
+    return len(docs)
+
+
+if __name__ == "__main__":
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
+    if not firebase_admin._apps:
+        firebase_admin.initialize_app(credentials.Certificate(firebase_key_path))
+    print(f"✅ Packed every call into {rebuild_all_buckets(firestore.client())} buckets.")
@@ -0,0 +1,90 @@
+"""
+Filter index over a loaded call table.
+
+Built once per data version, then each date/company/agent selection costs
+two binary searches over the sorted call days plus, when only some companies
+or agents are selected, a lookup of their category codes in that date
+range. Nothing is rescanned across the whole table, so filtering stays flat
+as the table grows.
+"""
+import numpy as np
+import pandas as pd
+
+
+class CallIndex:
+
+    def __init__(self, frame: pd.DataFrame):
+        days = frame["Call Date"].values.astype("datetime64[D]")
+        if len(days) and not (days[1:] >= days[:-1]).all():
+            order = np.argsort(days, kind="stable")
+            frame = frame.take(order)
+            days = days[order]
+        # Sorted by call day, so any date range is a contiguous slice of it
+        self.frame = frame
+        self.days = days
+
+        company = pd.Categorical(frame["Company"])
+        agent = pd.Categorical(frame["Agent"])
+        self.companies = company.categories
+        self.agents = agent.categories
+        self.company_codes = company.codes
+        self.agent_codes = agent.codes
+        # Calls without a company or agent never match a selection
+        self._unmatched_company = (self.company_codes < 0).any()
+        self._unmatched_agent = (self.agent_codes < 0).any()
+
+        # company code → agent codes seen with it
+        width = len(self.agents) + 1
+        pairs = np.unique(self.company_codes.astype(np.int64) * width + (self.agent_codes + 1))
+        pair_company, pair_agent = np.divmod(pairs, width)
+        self._agents_by_company = {
+            c: pair_agent[(pair_company == c) & (pair_agent > 0)] - 1 for c in range(len(self.companies))
+        }
+
+    def __len__(self):
+        return len(self.frame)
+
+    @property
+    def first_day(self):
+        return pd.Timestamp(self.days[0]).date() if len(self.days) else None
+
+    @property
+    def last_day(self):
+        return pd.Timestamp(self.days[-1]).date() if len(self.days) else None
+
+    def agents_for(self, companies) -> list:
+        codes = self.companies.get_indexer(list(companies))
+        found = [self._agents_by_company[c] for c in codes if c >= 0]
+        if not found:
+            return []
+        return self.agents[np.unique(np.concatenate(found))].tolist()
+
+    def _allowed(self, categories, selected):
+        """
+        Lookup table over category codes; the extra last slot is code -1
+        (missing), which never matches a selection.
+        """
+        allowed = np.zeros(len(categories) + 1, dtype=bool)
+        codes = categories.get_indexer(list(selected))
+        allowed[codes[codes >= 0]] = True
+        return allowed
+
+    def select(self, start, end, companies, agents) -> pd.DataFrame:
+        """
+        Calls from `start` to `end` (dates, inclusive) for the given
+        companies and agents. The date range alone is a slice of the indexed
+        frame, not a copy; treat the result as read-only.
+        """
+        lo = np.searchsorted(self.days, np.datetime64(start, "D"), side="left")
+        hi = np.searchsorted(self.days, np.datetime64(end, "D"), side="right")
+        rows = self.frame.iloc[lo:hi]
+
+        mask = None
+        if self._unmatched_company or not set(self.companies).issubset(companies):
+            mask = self._allowed(self.companies, companies)[self.company_codes[lo:hi]]
+        if self._unmatched_agent or not set(self.agents).issubset(agents):
+            agent_mask = self._allowed(self.agents, agents)[self.agent_codes[lo:hi]]
+            mask = agent_mask if mask is None else mask & agent_mask
+        if mask is not None:
+            rows = rows[mask]
+        return rows
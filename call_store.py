@@ -0,0 +1,446 @@
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+collection_name = "calls"
+
+# Server timestamp written by upload_jsons_to_firestore.py on every set();
+# used as the high-water mark for delta syncs.
+SYNC_FIELD = "ingested_at"
+
+# Bump whenever normalize_calls changes the frame's columns or dtypes so
+# stale snapshots from an older deploy are ignored instead of loaded.
+SNAPSHOT_FORMAT = 3
+SNAPSHOT_PATH = Path(".snapshots/calls.parquet")
+
+EMOTIONS = ["happy", "angry", "sad", "neutral"]
+
+RENAMES = {
+    "company":        "Company",
+    "agent":          "Agent",
+    "call_date":      "Call Date",
+    "date_raw":       "Date Raw",   # MMDDYYYY
+    "time":           "Call Time",
+    "call_id":        "Call ID",
+    "low_confidences":"Low Confidences",
+    "call_duration_s":"Call Duration (s)",
+}
+# Maps kept on the documents for reference; a per-row dict doesn't fit a
+# columnar table and everything the dashboard needs is already flattened
+NESTED_FIELDS = ["speaking_time_per_speaker", "speaking_seconds_per_speaker"]
+
+# Low-cardinality text columns, held as categoricals (codes + one copy of
+# each value) in the shared table
+CATEGORY_COLUMNS = ["Company", "Agent", "Call Time", "Date Raw"]
+# Measures don't need 64 bits; anything summed across many calls is widened
+# again where it's summed (see rollups.build_rollups)
+COMPACT_DTYPES = {
+    "average_happiness_value": np.float32,
+    "Low Confidences":         np.float32,
+    "Call Duration (s)":       np.float32,
+    "Call Duration (min)":     np.float32,
+    "Avg Happiness %":         np.float32,
+    "Total Emotions":          np.int32,
+    **{emotion: np.int32 for emotion in EMOTIONS},
+}
+
+
+# Only the fields the dashboard reads, as (dtype, value when missing).
+# select() keeps everything else on the server, notably the packed emotion
+# graph, which is read one call at a time (see emotion_series.py).
+PROJECTION = {
+    "call_id":                 (object, None),
+    "agent":                   (object, None),
+    "company":                 (object, None),
+    "time":                    (object, None),
+    "date_raw":                (object, None),
+    "call_date":               (object, None),
+    "ingested_at":             (object, None),
+    "average_happiness_value": (np.float64, np.nan),
+    "low_confidences":         (np.float64, np.nan),
+    "happy":                   (np.int64, 0),
+    "angry":                   (np.int64, 0),
+    "sad":                     (np.int64, 0),
+    "neutral":                 (np.int64, 0),
+    "call_duration_s":         (np.float64, np.nan),
+}
+
+
+class _ColumnBuffer:
+    """
+    Preallocated typed columns filled one document at a time.
+    """
+
+    def __init__(self, capacity: int):
+        capacity = max(capacity, 1)
+        self.size = 0
+        self.capacity = capacity
+        self.columns = {
+            field: np.full(capacity, missing, dtype=dtype)
+            for field, (dtype, missing) in PROJECTION.items()
+        }
+
+    def _grow(self):
+        for field, (dtype, missing) in PROJECTION.items():
+            col = self.columns[field]
+            self.columns[field] = np.concatenate([col, np.full(len(col), missing, dtype=dtype)])
+        self.capacity *= 2
+
+    def append(self, doc: dict):
+        if self.size == self.capacity:
+            self._grow()
+        i = self.size
+        for field, value in doc.items():
+            if value is not None and field in self.columns:
+                try:
+                    self.columns[field][i] = value
+                except (ValueError, TypeError, OverflowError):
+                    # Unparseable in a numeric field ("N/A"): left missing,
+                    # as normalize_calls' errors="coerce" would
+                    pass
+        self.size += 1
+
+    def to_frame(self) -> pd.DataFrame:
+        n = self.size
+        data = {field: col[:n] for field, col in self.columns.items()}
+        for field in ("call_date", "ingested_at"):
+            data[field] = pd.to_datetime(data[field], utc=True)
+        return pd.DataFrame(data)
+
+
+def fetch_calls(client, filters=(), order_by: str = "call_date", page_size: int = 1000) -> pd.DataFrame:
+    """
+    Page through 'calls' in Firestore `page_size` docs at a time, projected
+    to PROJECTION, straight into typed columns.
+
+    `filters` is a sequence of (field, op, value) predicates pushed into the
+    query; with none the whole collection is read.
+    """
+    base = client.collection(collection_name)
+    for field, op, value in filters:
+        base = base.where(filter=FieldFilter(field, op, value))
+    base = base.order_by(order_by)
+
+    # An aggregation count costs one read per 1,000 matches and lets us
+    # size the buffers once instead of growing them while paging.
+    try:
+        capacity = base.count().get()[0][0].value
+    except Exception:
+        capacity = page_size
+    buffer = _ColumnBuffer(capacity)
+
+    base = base.select(list(PROJECTION))
+    last_doc = None
+    while True:
+        query = base
+        if last_doc:
+            query = query.start_after(last_doc)
+        batch = list(query.limit(page_size).stream())
+        if not batch:
+            break
+        # accumulate and advance cursor
+        for d in batch:
+            buffer.append(d.to_dict())
+        last_doc = batch[-1]
+
+    return buffer.to_frame()
+
+
+def normalize_calls(records) -> pd.DataFrame:
+    """
+    Turn raw Firestore calls (dicts or a fetch_calls frame) into the
+    dashboard's canonical frame.
+
+    Raises ValueError when no record carries a parseable date field.
+    """
+    df = pd.DataFrame(records)
+    df.rename(columns=RENAMES, inplace=True)
+
+    if "Call Date" not in df.columns and "Date Raw" not in df.columns:
+        raise ValueError("Neither Call Date nor Date Raw found—cannot parse any dates.")
+
+    # Prefer the stored timestamp, falling back to the MMDDYYYY folder date
+    if "Call Date" in df.columns:
+        call_dates = pd.to_datetime(df["Call Date"], errors="coerce", utc=True)
+    else:
+        call_dates = pd.Series(pd.NaT, index=df.index, dtype="datetime64[ns, UTC]")
+    if "Date Raw" in df.columns:
+        raw_dates = pd.to_datetime(df["Date Raw"], format="%m%d%Y", errors="coerce")
+        call_dates = call_dates.fillna(raw_dates.dt.tz_localize("UTC"))
+    df["Call Date"] = call_dates
+
+    # Drop anything still unparseable in one go
+    df.dropna(subset=["Call Date"], inplace=True)
+
+    # Stored at upload time; run backfill_durations.py for older calls
+    if "Call Duration (s)" not in df.columns:
+        df["Call Duration (s)"] = None
+    df.drop(columns=NESTED_FIELDS, errors="ignore", inplace=True)
+
+    for emotion in EMOTIONS:
+        if emotion not in df.columns:
+            df[emotion] = 0
+
+    # --- Prepare Metadata ---
+    df["Call Duration (min)"] = df["Call Duration (s)"] / 60
+    df["Total Emotions"] = df[EMOTIONS].sum(axis=1)
+    df["Avg Happiness %"] = (df["happy"] / df["Total Emotions"]) * 100
+
+    return compact_calls(df.reset_index(drop=True))
+
+
+def compact_calls(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Store a normalized frame compactly: categorical text columns and
+    downcast measures. Also re-run after merging frames, since concatenating
+    categoricals with different categories falls back to plain text.
+    """
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype("category").cat.remove_unused_categories()
+    for col, dtype in COMPACT_DTYPES.items():
+        if col in df.columns:
+            values = pd.to_numeric(df[col], errors="coerce")
+            if np.issubdtype(dtype, np.integer):
+                # Counts: missing means none, as in PROJECTION
+                values = values.fillna(0)
+            df[col] = values.astype(dtype)
+    return df
+
+
+@dataclass(frozen=True)
+class CallTable:
+    """
+    One version of the call table. Swapped into CallStore.current as a
+    whole, so a reader never sees a frame with another version's number.
+    """
+    frame: pd.DataFrame
+    version: int
+    synced_at: float = None   # last time Firestore confirmed it; None = from snapshot
+
+
+class CallStore:
+    """
+    Process-wide call table that refreshes itself by delta sync.
+
+    The first sync reads the whole collection; later syncs only fetch
+    documents written since the high-water mark and merge them by Call ID.
+    Deletions are only picked up by a forced full resync.
+
+    start_refresher() runs the syncs on one background thread, so readers
+    never wait on Firestore: they keep the current table until the next one
+    is swapped in.
+
+    `source` is where calls are read from (see data_sources.py). `timer`,
+    if given, is anything with a span(stage, **attrs) context manager (such
+    as perf.PerfLog); each sync's load, normalization and snapshot write are
+    timed through it.
+    """
+
+    def __init__(self, source, page_size: int = 1000, snapshot_path=None, timer=None):
+        self.source = source
+        self.page_size = page_size
+        self.snapshot_path = Path(snapshot_path) if snapshot_path else None
+        self.timer = timer
+        self.current = None           # CallTable or None
+        self.high_water_mark = None   # (field, value) or None
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._refresher = None
+        self._refresher_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._full_resync = False
+        self._attempted = threading.Event()
+
+    @property
+    def frame(self):
+        table = self.current
+        return table.frame if table is not None else None
+
+    @property
+    def version(self) -> int:
+        table = self.current
+        return table.version if table is not None else 0
+
+    def _span(self, stage: str, **attrs):
+        if self.timer is None:
+            return nullcontext(attrs)
+        return self.timer.span(stage, **attrs)
+
+    def load_snapshot(self) -> bool:
+        """
+        Seed the store from the on-disk snapshot, if a compatible one exists.
+
+        The snapshot counts as unconfirmed (synced_at None) until the next
+        refresh revalidates it against Firestore with a delta sync from its
+        high-water mark.
+        """
+        if self.snapshot_path is None:
+            return False
+        snapshot = read_snapshot(self.snapshot_path)
+        if snapshot is None:
+            return False
+        frame, high_water_mark, version = snapshot
+        with self._lock:
+            self.high_water_mark = high_water_mark
+            self.current = CallTable(frame, version)
+        return True
+
+    def sync(self, full: bool = False) -> int:
+        """
+        Bring the frame up to date and return the number of documents read.
+        """
+        with self._lock:
+            previous = self.current
+            if full or previous is None or self.high_water_mark is None:
+                with self._span("sync:load", mode="full") as span:
+                    records = self.source.fetch_calls(page_size=self.page_size)
+                    span["docs"] = len(records)
+                with self._span("sync:normalize", mode="full", rows=len(records)):
+                    frame = normalize_calls(records)
+            else:
+                # Commit timestamps are strictly ordered, so anything not seen
+                # yet is newer than the mark. The call_date fallback re-reads
+                # the latest day to catch late uploads for it.
+                field, value = self.high_water_mark
+                op = ">" if field == SYNC_FIELD else ">="
+                with self._span("sync:load", mode="delta") as span:
+                    records = self.source.fetch_calls(
+                        filters=[(field, op, value)], order_by=field, page_size=self.page_size
+                    )
+                    span["docs"] = len(records)
+                frame = previous.frame
+                if len(records):
+                    with self._span("sync:normalize", mode="delta", rows=len(records)):
+                        frame = pd.concat([frame, normalize_calls(records)], ignore_index=True)
+                        frame = frame.drop_duplicates(subset="Call ID", keep="last")
+                        # Keep it in call-date order, as a full load returns it,
+                        # so the filter index needn't re-sort it
+                        frame = frame.sort_values("Call Date", kind="stable").reset_index(drop=True)
+                        frame = compact_calls(frame)
+
+            self.high_water_mark = _high_water_mark(frame, self.high_water_mark)
+            version = previous.version if previous is not None else 0
+            if previous is None or frame is not previous.frame:
+                version += 1
+                if self.snapshot_path is not None:
+                    with self._span("sync:snapshot", rows=len(frame)):
+                        write_snapshot(self.snapshot_path, frame, self.high_water_mark, version)
+            self.current = CallTable(frame, version, time.time())
+            return len(records)
+
+    def start_refresher(self, interval: float):
+        """
+        Sync now and then every `interval` seconds on a daemon thread.
+        Only one refresher runs per store, however often this is called.
+        """
+        with self._refresher_lock:
+            if self._refresher is not None:
+                return
+            self._refresher = threading.Thread(
+                target=self._refresh_loop, args=(interval,), daemon=True, name="call-store-refresher"
+            )
+            self._refresher.start()
+
+    def request_full_resync(self):
+        """
+        Have the refresher re-read every call on its next pass, now.
+        """
+        self._full_resync = True
+        self._wake.set()
+
+    def wait(self, timeout: float = None) -> bool:
+        """
+        Block until the refresher has made its first attempt; True if a
+        table is available by then.
+        """
+        if self.current is None:
+            self._attempted.wait(timeout)
+        return self.current is not None
+
+    def _refresh_loop(self, interval: float):
+        while True:
+            full, self._full_resync = self._full_resync, False
+            try:
+                self.sync(full=full)
+                self.last_error = None
+            except Exception as e:
+                # Keep serving the current table; try again next interval
+                self.last_error = e
+            self._attempted.set()
+            self._wake.wait(interval)
+            self._wake.clear()
+
+
+def write_snapshot(path: Path, frame: pd.DataFrame, high_water_mark, version: int):
+    """
+    Persist the normalized frame as Parquet, with the sync state stored in
+    the schema metadata. Written to a temp file and renamed into place so a
+    crash never leaves a half-written snapshot behind.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    state = {
+        "format": SNAPSHOT_FORMAT,
+        "version": version,
+        "high_water_mark": None if high_water_mark is None
+        else [high_water_mark[0], pd.Timestamp(high_water_mark[1]).isoformat()],
+        "saved_at": time.time(),
+    }
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[b"call_store"] = json.dumps(state).encode()
+    table = table.replace_schema_metadata(metadata)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(path: Path):
+    """
+    Memory-map a snapshot written by write_snapshot.
+
+    Returns (frame, high_water_mark, version), or None when the file is
+    missing, unreadable or from an incompatible format.
+    """
+    import pyarrow.parquet as pq
+
+    if not path.exists():
+        return None
+    try:
+        table = pq.read_table(path, memory_map=True)
+        state = json.loads(table.schema.metadata[b"call_store"])
+    except Exception:
+        return None
+    if state.get("format") != SNAPSHOT_FORMAT:
+        return None
+
+    high_water_mark = state["high_water_mark"]
+    if high_water_mark is not None:
+        high_water_mark = (high_water_mark[0], pd.Timestamp(high_water_mark[1]))
+    return table.to_pandas(), high_water_mark, state["version"]
+
+
+def _high_water_mark(frame: pd.DataFrame, previous=None):
+    """
+    Highest ingest timestamp seen so far; falls back to the latest call date
+    for collections uploaded before ingest timestamps were written.
+    """
+    if SYNC_FIELD in frame.columns and frame[SYNC_FIELD].notna().any():
+        return SYNC_FIELD, frame[SYNC_FIELD].max()
+    if previous is not None and previous[0] == SYNC_FIELD:
+        return previous
+    if frame.empty:
+        return None
+    return "call_date", frame["Call Date"].max()
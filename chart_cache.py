@@ -0,0 +1,168 @@
+"""
+Process-wide LRU cache of rendered charts, filled by a pool of render
+workers.
+
+A chart is rendered once, to a PNG, and that PNG is the chart from then on:
+the screen, the Excel "Charts" sheet and the PDF pages all use the same
+bytes. Entries are keyed by (chart id, filter signature, data version), so
+a rerun that doesn't change what a chart shows doesn't render it again.
+Least recently used entries are evicted once the cache goes over its
+memory budget.
+
+Renders run in worker processes on the Agg backend (pyplot isn't thread
+safe, and rendering holds the GIL), so independent charts are drawn in
+parallel while the script carries on; request() hands back a future.
+"""
+import io
+import multiprocessing
+import sys
+import threading
+import types
+from collections import OrderedDict
+from concurrent.futures import BrokenExecutor, Future, ProcessPoolExecutor
+
+# Same settings st.pyplot uses, so cached charts look the same on screen
+PNG_DPI = 200
+
+
+def figure_png(fig) -> bytes:
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", dpi=PNG_DPI, bbox_inches="tight")
+    return buffer.getvalue()
+
+
+def render_png(chart_id, *args) -> bytes:
+    """
+    Render one chart from the registry to PNG. Runs in the render workers.
+    """
+    # Imported here, so the server process only loads matplotlib if it
+    # ends up rendering inline
+    import matplotlib.pyplot as plt
+    from charts import CHARTS
+
+    fig = CHARTS[chart_id][1](*args)
+    try:
+        return figure_png(fig)
+    finally:
+        plt.close(fig)
+
+
+def _init_worker():
+    import matplotlib
+
+    matplotlib.use("Agg")
+
+
+def _ready():
+    return True
+
+
+def render_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    Worker processes for render_png, all started before this returns.
+
+    Spawned rather than forked: the server process has threads running,
+    and a fork would copy their locks. A spawned process re-runs the
+    parent's __main__, which while a Streamlit script runs is the dashboard
+    itself, so a bare module stands in for it while the workers start.
+    The pool starts workers lazily, one per submit, so submitting one task
+    per worker here means none is started later from a script run.
+    """
+    pool = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+    )
+    main = sys.modules["__main__"]
+    sys.modules["__main__"] = types.ModuleType("__main__")
+    try:
+        started = [pool.submit(_ready) for _ in range(workers)]
+    finally:
+        sys.modules["__main__"] = main
+    for future in started:
+        future.result()
+    return pool
+
+
+def _done(value) -> Future:
+    future = Future()
+    future.set_result(value)
+    return future
+
+
+class ChartCache:
+
+    def __init__(self, max_bytes: int = 256 << 20, executor=None):
+        self.max_bytes = max_bytes
+        self.executor = executor    # None renders in the calling thread
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()   # key → PNG bytes
+        self._pending = {}              # key → Future of a render in flight
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def request(self, key, prepare) -> Future:
+        """
+        A future of the PNG for `key`. On a miss, `prepare()` returns the
+        render job as (fn, *args) and it's submitted to the workers; a key
+        already being rendered (for any session) shares that render.
+        """
+        with self._lock:
+            png = self._entries.get(key)
+            if png is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return _done(png)
+            future = self._pending.get(key)
+            if future is not None:
+                self.hits += 1
+                return future
+            self.misses += 1
+            future = Future()
+            self._pending[key] = future
+
+        try:
+            fn, *args = prepare()
+            if self.executor is None:
+                render = _done(fn(*args))
+            else:
+                try:
+                    render = self.executor.submit(fn, *args)
+                except BrokenExecutor:
+                    # A worker died (e.g. out of memory); render here instead
+                    render = _done(fn(*args))
+        except Exception as e:
+            render = Future()
+            render.set_exception(e)
+        render.add_done_callback(lambda done: self._finish(key, future, done))
+        return future
+
+    def get(self, key, prepare) -> bytes:
+        return self.request(key, prepare).result()
+
+    def _finish(self, key, future, render):
+        error = render.exception()
+        with self._lock:
+            del self._pending[key]
+            if error is None:
+                png = render.result()
+                self._entries[key] = png
+                self.nbytes += len(png)
+                # Always keep the newest entry, even if it alone is over budget
+                while self.nbytes > self.max_bytes and len(self._entries) > 1:
+                    _, evicted = self._entries.popitem(last=False)
+                    self.nbytes -= len(evicted)
+        # Failed renders aren't cached, so the next request retries them
+        if error is None:
+            future.set_result(png)
+        else:
+            future.set_exception(error)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
@@ -0,0 +1,233 @@
+"""
+The dashboard's charts, one render function per chart id.
+
+Every renderer takes the filtered calls and the filtered daily rollups and
+returns a new matplotlib Figure, so a chart is fully determined by its id
+and the data behind it. That's what lets rendered charts be cached and
+shared across sessions, and rendered in worker processes (see
+chart_cache.py).
+"""
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import seaborn as sns
+from matplotlib.colors import to_rgba
+from matplotlib.patches import Patch
+
+from rollups import aggregate
+
+company_colors = {
+    "Quantum": "#1f77b4",
+    "StVincent": "#ff7f0e",
+    "ABCMotors": "#2ca02c"
+}
+emotion_colors = ["green", "red", "blue", "orange"]
+
+# Scatter plots with more calls than this are drawn as per-company density
+# grids, whose cost depends on the grid rather than the number of calls
+SCATTER_MAX_POINTS = 5_000
+SCATTER_BINS = (80, 50)    # x, y
+
+
+def _observed(frame, *columns):
+    """
+    Drop categories with no rows in `frame`, so seaborn's legends and
+    facets only show what's selected rather than every known value.
+    """
+    return frame.assign(**{
+        col: frame[col].cat.remove_unused_categories()
+        for col in columns if isinstance(frame[col].dtype, pd.CategoricalDtype)
+    })
+
+
+def agent_leaderboard(rollups):
+    return (
+        aggregate(rollups, "Agent")
+        [["Total Calls", "Avg Happiness %", "Avg Call Duration (min)"]]
+        .set_axis(["Total_Calls", "Avg_Happiness_Percent", "Avg_Call_Duration_Min"], axis=1)
+        .reset_index()
+        .sort_values(by="Avg_Happiness_Percent", ascending=False)
+    )
+
+
+def leaderboard_table(calls, rollups):
+    agent_summary = agent_leaderboard(rollups)
+    fig, ax = plt.subplots(figsize=(10, 6))
+    ax.axis('tight')
+    ax.axis('off')
+    table_data = agent_summary.round(1)
+    table = ax.table(cellText=table_data.values, colLabels=table_data.columns, loc='center')
+    table.auto_set_font_size(False)
+    table.set_fontsize(10)
+    table.auto_set_column_width(col=list(range(len(agent_summary.columns))))
+    return fig
+
+
+def happiness_by_agent(calls, rollups):
+    fig, ax = plt.subplots(figsize=(10, 5))
+    aggregate(rollups, "Agent")["Avg Happiness %"].sort_values().plot(kind="barh", ax=ax, color="teal")
+    ax.set_xlabel("Avg Happiness (%)")
+    return fig
+
+
+def rolling_happiness(company_roll, window_days):
+    """
+    Takes the rolling KPI frame (see rolling_kpis.py) rather than calls
+    and rollups: the windows reach back before the selected dates.
+    """
+    fig, ax = plt.subplots(figsize=(10, 4))
+    for company in company_roll.columns:
+        ax.plot(company_roll.index, company_roll[company], label=company, color=company_colors.get(company))
+    ax.set_ylabel(f"{window_days}-day Happiness %")
+    ax.set_xlabel("Date")
+    ax.legend()
+    return fig
+
+
+def emotion_by_company(calls, rollups):
+    fig, ax = plt.subplots(figsize=(10, 6))
+    emo_totals = aggregate(rollups, "Company")[["happy", "angry", "sad", "neutral"]]
+    emo_totals.plot(kind="bar", ax=ax, color=emotion_colors)
+    ax.set_ylabel("Emotion Count")
+    ax.set_xlabel("Company")
+    ax.legend(title="Emotion")
+    return fig
+
+
+def happiness_by_time(calls, rollups):
+    fig, ax = plt.subplots(figsize=(10, 6))
+    aggregate(rollups, "Call Time")["Avg Happiness %"].plot(kind="bar", ax=ax, color="orange")
+    ax.set_xlabel("Call Time")
+    ax.set_ylabel("Avg Happiness (%)")
+    return fig
+
+
+def _binned_scatter(ax, calls, x, y):
+    """
+    2D histograms per company on a shared grid. Each cell takes the color
+    of the company with the most calls in it, more opaque the more calls
+    it holds (on a log scale, so sparse regions still show).
+    """
+    calls = _observed(calls, "Company")
+    xs = calls[x].to_numpy(dtype=np.float64)
+    ys = calls[y].to_numpy(dtype=np.float64)
+    valid = np.isfinite(xs) & np.isfinite(ys)
+    if not valid.any():
+        return
+    companies = pd.Categorical(calls["Company"])
+    codes = companies.codes
+
+    x_edges = np.histogram_bin_edges(xs[valid], bins=SCATTER_BINS[0])
+    y_edges = np.histogram_bin_edges(ys[valid], bins=SCATTER_BINS[1])
+    # (companies, y bins, x bins)
+    grids = np.stack([
+        np.histogram2d(ys[valid & (codes == i)], xs[valid & (codes == i)], bins=[y_edges, x_edges])[0]
+        for i in range(len(companies.categories))
+    ])
+    total = grids.sum(axis=0)
+
+    colors = np.array([to_rgba(company_colors.get(c, "gray")) for c in companies.categories])
+    image = colors[grids.argmax(axis=0)]
+    image[..., 3] = np.where(total > 0, 0.15 + 0.85 * np.log1p(total) / np.log1p(total.max()), 0)
+    ax.imshow(image, origin="lower", aspect="auto", interpolation="nearest",
+              extent=(x_edges[0], x_edges[-1], y_edges[0], y_edges[-1]))
+
+    handles = [Patch(color=color, label=c) for c, color in zip(companies.categories, colors)]
+    ax.legend(handles=handles, title=f"Company ({valid.sum():,} calls, binned)")
+
+
+def _scatter(calls, x, y, xlabel, ylabel):
+    """
+    Exact points for small selections, density grids for large ones.
+    """
+    fig, ax = plt.subplots(figsize=(8, 5))
+    if len(calls) > SCATTER_MAX_POINTS:
+        _binned_scatter(ax, calls, x, y)
+    else:
+        sns.scatterplot(data=_observed(calls, "Company"), x=x, y=y,
+                        hue="Company", palette=company_colors, ax=ax)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+    return fig
+
+
+def duration_vs_happiness(calls, rollups):
+    return _scatter(calls, "Call Duration (min)", "Avg Happiness %", "Call Duration (min)", "Avg Happiness (%)")
+
+
+def happiness_vs_confidence(calls, rollups):
+    return _scatter(calls, "Low Confidences", "Avg Happiness %", "Low Confidence (%)", "Avg Happiness (%)")
+
+
+def emotion_by_agent(calls, rollups):
+    emotion_pivot = aggregate(rollups, "Agent")[["happy", "angry", "sad", "neutral"]]
+    emotion_pivot_percent = emotion_pivot.div(emotion_pivot.sum(axis=1), axis=0) * 100
+    fig, ax = plt.subplots(figsize=(10, 6))
+    emotion_pivot_percent.plot(kind='bar', stacked=True, ax=ax, color=emotion_colors)
+    ax.set_ylabel("Emotion %")
+    ax.set_xlabel("Agent")
+    return fig
+
+
+def duration_by_company(calls, rollups):
+    fig, ax = plt.subplots(figsize=(8, 4))
+    avg_dur = aggregate(rollups, "Company")["Avg Call Duration (min)"]
+    colors = [company_colors.get(c, "gray") for c in avg_dur.index]
+    avg_dur.plot(kind="bar", ax=ax, color=colors)
+    ax.set_ylabel("Avg Duration (min)")
+    ax.set_xlabel("Company")
+    return fig
+
+
+def call_volume(calls, rollups):
+    volume = (
+        aggregate(rollups, ["Day", "Agent", "Company"])["Total Calls"]
+        .reset_index(name="Call Count")
+        .rename(columns={"Day": "Call Date"})
+    )
+    volume = _observed(volume, "Agent", "Company")
+    facet = sns.FacetGrid(volume, col="Company", col_wrap=2, height=4, sharey=False)
+    facet.map_dataframe(sns.lineplot, x="Call Date", y="Call Count", hue="Agent")
+    facet.add_legend()
+    facet.set_titles("{col_name}")
+
+    # Rotate x-axis labels to avoid overlap
+    for ax in facet.axes.flat:
+        for label in ax.get_xticklabels():
+            label.set_rotation(45)
+            label.set_horizontalalignment('right')
+    return facet.figure
+
+
+# chart id → (export title, renderer). Renderers take the filtered calls
+# and rollups, except rolling_happiness (see above).
+CHARTS = {
+    "leaderboard": ("Agent Leaderboard", leaderboard_table),
+    "happiness_by_agent": ("Average Happiness by Agent", happiness_by_agent),
+    "rolling_happiness": ("Rolling Happiness per Company", rolling_happiness),
+    "emotion_by_company": ("Emotion Distribution by Company", emotion_by_company),
+    "happiness_by_time": ("Happiness by Time of Day", happiness_by_time),
+    "duration_vs_happiness": ("Duration vs Happiness", duration_vs_happiness),
+    "happiness_vs_confidence": ("Happiness vs Low Confidence", happiness_vs_confidence),
+    "emotion_by_agent": ("Emotion Proportion by Agent", emotion_by_agent),
+    "duration_by_company": ("Avg Call Duration by Company", duration_by_company),
+    "call_volume": ("Call Volume per Agent per Day", call_volume),
+}
+
+# Call columns each renderer reads; the others only use the rollups. A
+# render worker is sent just these rather than the whole filtered table.
+CALL_COLUMNS = {
+    "duration_vs_happiness": ["Company", "Call Duration (min)", "Avg Happiness %"],
+    "happiness_vs_confidence": ["Company", "Low Confidences", "Avg Happiness %"],
+}
+
+
+def chart_inputs(chart_id, calls, rollups):
+    """
+    (calls, rollups) cut down to what `chart_id` reads, for sending to a
+    render worker.
+    """
+    columns = CALL_COLUMNS.get(chart_id)
+    if columns is None:
+        return None, rollups
+    return calls[columns], None
@@ -1,135 +1,162 @@
-import firebase_admin
-from firebase_admin import credentials, firestore
-
-# Initialize Firebase if not already
-cred = credentials.Certificate("/Users/Chloe/Downloads/valence-acsi-dashboard-firebase-adminsdk-fbsvc-e8065d1b80.json")
-if not firebase_admin._apps:
-    firebase_admin.initialize_app(cred)
-
-db = firestore.client()
-
-# Count documents
-calls_ref = db.collection('calls')
-docs = calls_ref.stream()
-
-count = sum(1 for _ in docs)
-print(f"✅ Total documents in Firestore 'calls' collection: {count}")
-
-calls_ref = db.collection('calls')
-docs = calls_ref.stream()
-
-missing_call_date = []
-for doc in docs:
-    data = doc.to_dict()
-    if not data.get("Call Date"):
-        missing_call_date.append(doc.id)
-
-print(f"❓ Documents missing 'Call Date': {len(missing_call_date)}")
-print(f"Example missing documents: {missing_call_date[:5]}")
-
+"""
+Consistency audit between an exported ZIP of call JSONs and the Firestore
+'calls' collection.
+
+Reads each source once: an aggregation count plus one projected pass over
+Firestore (IDs and call_date only), and one pooled pass over the ZIP that
+runs every per-file check. Writes a JSON report and prints a summary.
+"""
+import json
+import os
+import time
 import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
 from pathlib import Path
+
 import firebase_admin
 from firebase_admin import credentials, firestore
 
-# --- CONFIGURATION ---
+from upload_jsons_to_firestore import validate_call
 
-# Your paths
+# --- CONFIGURATION ---
 zip_path = "/Users/Chloe/Downloads/JSONs-20250424T060428Z-001.zip"
 firebase_key_path = "/Users/Chloe/Downloads/valence-acsi-dashboard-firebase-adminsdk-fbsvc-e8065d1b80.json"
+collection_name = "calls"
+report_path = "audit_report.json"
+required_fields = ["metadata", "emotion_graph"]
+audit_workers = os.cpu_count() or 1
+audit_chunk_size = 64
+examples_shown = 5
 
-# --- SETUP ---
-
-# Initialize Firebase
-if not firebase_admin._apps:
-    cred = credentials.Certificate(firebase_key_path)
-    firebase_admin.initialize_app(cred)
-
-db = firestore.client()
-
-# --- STEP 1: Read all JSON filenames from the ZIP ---
-
-with zipfile.ZipFile(zip_path, "r") as zip_ref:
-    all_json_filenames = [Path(f).stem for f in zip_ref.namelist() if f.endswith(".json")]
-
-print(f"✅ Total JSON files inside ZIP: {len(all_json_filenames)}")
-
-# --- STEP 2: Fetch all document IDs from Firestore ---
-
-calls_ref = db.collection('calls')
-docs = calls_ref.stream()
-
-firestore_doc_ids = [doc.id for doc in docs]
-print(f"✅ Total documents in Firestore: {len(firestore_doc_ids)}")
-
-# --- STEP 3: Find missing files ---
-
-missing_files = set(all_json_filenames) - set(firestore_doc_ids)
 
-if missing_files:
-    print(f"❌ Missing {len(missing_files)} file(s):")
-    for missing in missing_files:
-        print("-", missing)
-else:
-    print("✅ No missing files! Everything matches.")
+# --- ZIP CHECKS (run in worker processes) ---
+_worker_zip = None
 
-import zipfile
-import json
-from pathlib import Path
 
-zip_path = "/Users/Chloe/Downloads/JSONs-20250424T060428Z-001.zip"
+def _init_worker(path):
+    global _worker_zip
+    _worker_zip = zipfile.ZipFile(path, "r")
 
-# Open the zip
-with zipfile.ZipFile(zip_path, "r") as zip_ref:
-    json_files = [f for f in zip_ref.namelist() if f.endswith(".json")]
 
-    print(f"🔍 Checking {len(json_files)} JSON files...")
-
-    bad_files = []
-
-    for file_name in json_files:
+def audit_members(names):
+    """
+    Run every per-file check on each member, reading it once.
+    """
+    results = []
+    for name in names:
+        result = {"file": name, "doc_id": Path(name).stem}
         try:
-            with zip_ref.open(file_name) as f:
-                content = f.read().decode("utf-8")  # Attempt UTF-8 decode
-                json.loads(content)  # Attempt to parse as JSON
+            data = json.loads(_worker_zip.read(name).decode("utf-8"))
         except Exception as e:
-            bad_files.append((file_name, str(e)))
-
-# Report
-if bad_files:
-    print(f"❌ Found {len(bad_files)} bad file(s):")
-    for name, error in bad_files:
-        print(f"- {name}: {error}")
-else:
-    print("✅ All JSONs parsed successfully.")
-
-import zipfile
-import json
-from pathlib import Path
-
-required_fields = ["metadata", "emotion_graph"]
-
-zip_path = "/Users/Chloe/Downloads/JSONs-20250424T060428Z-001.zip"
-
-# Open the zip
-with zipfile.ZipFile(zip_path, "r") as zip_ref:
-    json_files = [f for f in zip_ref.namelist() if f.endswith(".json")]
-
-    print(f"🔍 Checking {len(json_files)} JSON files for required fields...")
-
-    incomplete_files = []
-
-    for file_name in json_files:
-        with zip_ref.open(file_name) as f:
-            content = f.read().decode("utf-8")
-            data = json.loads(content)
-            if not all(field in data for field in required_fields):
-                incomplete_files.append(file_name)
-
-# Report
-if incomplete_files:
-    print(f"❌ Found {len(incomplete_files)} incomplete file(s):")
-    for name in incomplete_files:
-        print(f"- {name}")
-else:
-    print("✅ All JSONs have required fields.")
+            result["parse_error"] = str(e)
+            results.append(result)
+            continue
+
+        result["missing_fields"] = [f for f in required_fields if f not in data]
+        if isinstance(data, dict):
+            # Same ID and validation the uploader uses
+            result["doc_id"] = data.get("metadata", {}).get("call_id", result["doc_id"])
+            result["upload_error"] = validate_call(data)
+        results.append(result)
+    return results
+
+
+def audit_zip(path):
+    with zipfile.ZipFile(path, "r") as z:
+        json_files = [f for f in z.namelist() if f.endswith(".json")]
+    mp3_dumps = [f for f in json_files if f.endswith(".mp3.json")]
+    to_check = [f for f in json_files if not f.endswith(".mp3.json")]
+    chunks = [to_check[i:i + audit_chunk_size] for i in range(0, len(to_check), audit_chunk_size)]
+
+    results = []
+    with ProcessPoolExecutor(audit_workers, initializer=_init_worker, initargs=(path,)) as pool:
+        for chunk_results in pool.map(audit_members, chunks):
+            results.extend(chunk_results)
+
+    return {
+        "json_files": len(json_files),
+        "mp3_dumps": len(mp3_dumps),
+        "bad_json": [
+            {"file": r["file"], "error": r["parse_error"]} for r in results if "parse_error" in r
+        ],
+        "missing_required_fields": [
+            {"file": r["file"], "fields": r["missing_fields"]} for r in results if r.get("missing_fields")
+        ],
+        "not_uploadable": [
+            {"file": r["file"], "reason": r["upload_error"]} for r in results if r.get("upload_error")
+        ],
+        # What the uploader would have written
+        "expected_doc_ids": sorted(
+            r["doc_id"] for r in results if "parse_error" not in r and not r.get("upload_error")
+        ),
+    }
+
+
+# --- FIRESTORE CHECKS ---
+def audit_firestore(db):
+    coll = db.collection(collection_name)
+    # Server-side aggregation: one read per 1,000 index entries
+    total = coll.count().get()[0][0].value
+
+    doc_ids = set()
+    missing_call_date = []
+    for doc in coll.select(["call_date"]).stream():
+        doc_ids.add(doc.id)
+        if not doc.to_dict().get("call_date"):
+            missing_call_date.append(doc.id)
+
+    return {
+        "total_count": total,
+        "streamed": len(doc_ids),
+        "missing_call_date": sorted(missing_call_date),
+    }, doc_ids
+
+
+def main():
+    # Initialize Firebase if not already
+    if not firebase_admin._apps:
+        cred = credentials.Certificate(firebase_key_path)
+        firebase_admin.initialize_app(cred)
+    db = firestore.client()
+
+    started = time.time()
+    print("🔍 Auditing Firestore and ZIP...")
+    fs_report, doc_ids = audit_firestore(db)
+    zip_report = audit_zip(zip_path)
+    missing = sorted(set(zip_report.pop("expected_doc_ids")) - doc_ids)
+
+    report = {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "zip_path": zip_path,
+        "firestore": fs_report,
+        "zip": zip_report,
+        "missing_in_firestore": missing,
+        "elapsed_s": round(time.time() - started, 2),
+    }
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+
+    # --- SUMMARY ---
+    def show(label, items):
+        if items:
+            print(f"❌ {label}: {len(items)}")
+            for item in items[:examples_shown]:
+                print("-", item)
+        else:
+            print(f"✅ {label}: 0")
+
+    print(f"✅ Total documents in Firestore '{collection_name}' collection: {fs_report['total_count']}")
+    if fs_report["streamed"] != fs_report["total_count"]:
+        print(f"⚠️ Streamed {fs_report['streamed']} documents; the collection changed during the audit.")
+    show("Documents missing 'call_date'", fs_report["missing_call_date"])
+    print(f"✅ Total JSON files inside ZIP: {zip_report['json_files']} ({zip_report['mp3_dumps']} mp3 dumps)")
+    show("Bad JSON files", zip_report["bad_json"])
+    show(f"Files missing {required_fields}", zip_report["missing_required_fields"])
+    show("Files the uploader would skip", zip_report["not_uploadable"])
+    show("Calls missing from Firestore", missing)
+    print(f"📄 Full report written to {report_path} ({report['elapsed_s']}s).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,410 @@
+"""
+Where the dashboard's calls and rollups come from.
+
+FirestoreSource is production: calls are read from Firestore, either one
+document each or, with `call_buckets = true` in the secrets, from the packed
+per-company-day buckets (see call_buckets.py), and the daily rollups are
+built from the calls the dashboard already holds. LocalSource reads Parquet
+files from a directory through DuckDB, with no credentials at all, for
+offline analysis, testing and benchmarking; it builds the daily rollups behind the leaderboard and
+aggregate charts with a GROUP BY in DuckDB instead of grouping calls in
+pandas.
+
+Both hand back the same frames (fetch_calls' typed PROJECTION columns, and
+rollups with ROLLUP_KEYS + ROLLUP_SUMS columns), so everything downstream
+is shared. The dashboard uses a LocalSource when its secrets have a
+[local_data] section with a `path`, and Firestore otherwise.
+
+Run this module directly to fill a local directory from an export ZIP or
+from Firestore:
+
+    python data_sources.py from-zip JSONsLastWeek.zip local_data/
+    python data_sources.py from-firestore local_data/ --key firebase-key.json
+"""
+import argparse
+import os
+import threading
+import uuid
+import zipfile
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from call_buckets import fetch_bucketed_calls
+from call_store import EMOTIONS, PROJECTION, collection_name, fetch_calls
+from emotion_series import GRAPH_FIELD, GRAPH_POINTS_FIELD
+from rollups import ROLLUP_KEYS, ROLLUP_SUMS, build_rollups, fetch_rollups
+
+firebase_key_path = "/Users/Chloe/Downloads/valence-acsi-dashboard-firebase-adminsdk-fbsvc-e8065d1b80.json"
+
+# Documents per Parquet file when filling a local directory
+LOCAL_FILE_ROWS = 50_000
+
+# Firestore filter operators → SQL
+_SQL_OPS = {"==": "=", "<": "<", "<=": "<=", ">": ">", ">=": ">=", "in": "IN"}
+_TIMESTAMP_FIELDS = {"call_date", "ingested_at"}
+
+
+class FirestoreSource:
+    """
+    Calls from Firestore. With `buckets`, they're read from call_buckets,
+    one read per company-day, rather than one per call.
+    """
+
+    def __init__(self, client, buckets: bool = False):
+        self.client = client
+        self.buckets = buckets
+
+    @classmethod
+    def from_secrets(cls, firebase_secrets, buckets: bool = False):
+        """
+        Connect with a service account given as the [firebase] secrets table.
+        """
+        import firebase_admin
+        from firebase_admin import credentials, firestore
+
+        if not firebase_admin._apps:
+            creds = dict(firebase_secrets)
+            creds["private_key"] = creds["private_key"].replace('\\n', '\n')
+            firebase_admin.initialize_app(credentials.Certificate(creds))
+        return cls(firestore.client(), buckets=buckets)
+
+    def fetch_calls(self, filters=(), order_by: str = "call_date", page_size: int = 1000) -> pd.DataFrame:
+        if self.buckets:
+            return fetch_bucketed_calls(self.client, filters=filters, order_by=order_by)
+        return fetch_calls(self.client, filters=filters, order_by=order_by, page_size=page_size)
+
+    def fetch_rollups(self, calls: pd.DataFrame = None) -> pd.DataFrame:
+        """
+        Daily rollups of `calls` (a normalized call frame), built in memory:
+        the uploader's call_rollups grow nearly as fast as the calls, and
+        re-reading them would cost about one read per two calls. Without
+        `calls`, the uploader's rollups are read from Firestore.
+        """
+        if calls is not None:
+            return build_rollups(calls)
+        return fetch_rollups(self.client)
+
+    def emotion_graph(self, call_id: str):
+        """
+        One call's packed emotion graph (see emotion_series.py), or None.
+        """
+        doc_ref = self.client.collection(collection_name).document(call_id)
+        snapshot = doc_ref.get(field_paths=[GRAPH_FIELD])
+        if not snapshot.exists:
+            return None
+        return (snapshot.to_dict() or {}).get(GRAPH_FIELD)
+
+
+class LocalSource:
+    """
+    Calls stored as Parquet files under `<path>/calls/`, queried with
+    DuckDB. Files are only ever added: a call written again shadows its
+    older copies (the latest ingested_at wins), as a Firestore overwrite
+    would.
+    """
+
+    def __init__(self, path):
+        import duckdb
+
+        self.path = Path(path)
+        self.calls_dir = self.path / "calls"
+        self._connection = duckdb.connect()
+        # Timestamps come back (and day boundaries are drawn) in UTC
+        self._connection.execute("SET TimeZone = 'UTC'")
+        self._lock = threading.Lock()
+
+    def _query(self, sql: str, params=()) -> pd.DataFrame:
+        # A cursor per query: one DuckDB connection isn't safe to share
+        # between the refresher thread and script runs
+        with self._lock:
+            cursor = self._connection.cursor()
+        try:
+            return cursor.execute(sql, list(params)).fetch_arrow_table().to_pandas()
+        finally:
+            cursor.close()
+
+    def _calls_sql(self, columns) -> str:
+        """
+        Latest copy of every call, restricted to `columns`.
+        """
+        pattern = str(self.calls_dir / "*.parquet").replace("'", "''")
+        return f"""
+            SELECT {", ".join(columns)}
+            FROM read_parquet('{pattern}', union_by_name = true)
+            QUALIFY row_number() OVER (PARTITION BY call_id ORDER BY ingested_at DESC) = 1
+        """
+
+    def _has_calls(self) -> bool:
+        return any(self.calls_dir.glob("*.parquet"))
+
+    def fetch_calls(self, filters=(), order_by: str = "call_date", page_size: int = 1000) -> pd.DataFrame:
+        """
+        Same contract as call_store.fetch_calls (`page_size` is unused):
+        PROJECTION columns, missing counts as 0, and like a Firestore
+        order_by, calls without the ordering field are left out.
+        """
+        if order_by not in PROJECTION:
+            raise ValueError(f"Unknown field to order by: {order_by}")
+        if not self._has_calls():
+            return _empty_calls()
+
+        conditions = [f"{order_by} IS NOT NULL"]
+        params = []
+        for field, op, value in filters:
+            if field not in PROJECTION or op not in _SQL_OPS:
+                raise ValueError(f"Unsupported filter: {field} {op}")
+            if op == "in":
+                values = [_sql_value(v) for v in value]
+                conditions.append(f"{field} IN ({', '.join('?' * len(values))})" if values else "false")
+                params += values
+            else:
+                conditions.append(f"{field} {_SQL_OPS[op]} ?")
+                params.append(_sql_value(value))
+
+        columns = []
+        for field, (dtype, missing) in PROJECTION.items():
+            if np.issubdtype(dtype, np.integer):
+                columns.append(f"COALESCE({field}, {missing})::BIGINT AS {field}")
+            elif dtype is np.float64:
+                columns.append(f"{field}::DOUBLE AS {field}")
+            else:
+                columns.append(field)
+        frame = self._query(
+            f"""
+            SELECT * FROM ({self._calls_sql(columns)})
+            WHERE {" AND ".join(conditions)}
+            ORDER BY {order_by}, call_id
+            """,
+            params,
+        )
+        for field in _TIMESTAMP_FIELDS:
+            frame[field] = pd.to_datetime(frame[field], utc=True)
+        return frame
+
+    def fetch_rollups(self, calls: pd.DataFrame = None) -> pd.DataFrame:
+        """
+        Daily rollups grouped in DuckDB (`calls` is unused), matching what
+        rollups.build_rollups makes of the same calls after normalize_calls.
+        """
+        if not self._has_calls():
+            return pd.DataFrame(columns=ROLLUP_KEYS + ROLLUP_SUMS)
+
+        counts = {e: f"COALESCE({e}, 0)" for e in EMOTIONS}
+        total = " + ".join(counts.values())
+        columns = [
+            "call_id", "ingested_at", "company", "agent", "time", "call_duration_s", "low_confidences",
+            # Calls without a call_date aren't in the call table either (see
+            # fetch_calls), so they're left out here too
+            "date_trunc('day', call_date) AS day",
+            *(f"{expr} AS {e}" for e, expr in counts.items()),
+            f"CASE WHEN {total} > 0 THEN 100.0 * {counts['happy']} / ({total}) END AS happiness",
+        ]
+        frame = self._query(f"""
+            SELECT
+                company AS "Company",
+                agent AS "Agent",
+                day AS "Day",
+                time AS "Call Time",
+                count(*) AS calls,
+                COALESCE(sum(happiness), 0) AS happiness_sum,
+                count(happiness) AS happiness_count,
+                COALESCE(sum(call_duration_s), 0) AS duration_s_sum,
+                count(call_duration_s) AS duration_count,
+                COALESCE(sum(low_confidences), 0) AS low_confidences_sum,
+                {", ".join(f"sum({e})::BIGINT AS {e}" for e in EMOTIONS)}
+            FROM ({self._calls_sql(columns)})
+            WHERE day IS NOT NULL AND company IS NOT NULL AND agent IS NOT NULL AND time IS NOT NULL
+            GROUP BY ALL
+            ORDER BY "Day", "Company", "Agent", "Call Time"
+        """)
+        frame["Day"] = pd.to_datetime(frame["Day"], utc=True)
+        return frame[ROLLUP_KEYS + ROLLUP_SUMS]
+
+    def emotion_graph(self, call_id: str):
+        if not self._has_calls():
+            return None
+        pattern = str(self.calls_dir / "*.parquet").replace("'", "''")
+        rows = self._query(
+            f"""
+            SELECT {GRAPH_FIELD} FROM read_parquet('{pattern}', union_by_name = true)
+            WHERE call_id = ? ORDER BY ingested_at DESC LIMIT 1
+            """,
+            [call_id],
+        )
+        if rows.empty:
+            return None
+        return rows[GRAPH_FIELD].iloc[0]
+
+    def write_calls(self, payloads) -> int:
+        """
+        Add uploader payloads (upload_jsons_to_firestore.build_payload) as
+        one new Parquet file, stamped with the current time as ingested_at
+        so delta syncs pick them up. Returns the number written.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        fields = [f for f in PROJECTION if f != "ingested_at"]
+        frame = pd.DataFrame.from_records(list(payloads), columns=fields + [GRAPH_FIELD, GRAPH_POINTS_FIELD])
+        if frame.empty:
+            return 0
+        frame["ingested_at"] = pd.Timestamp.now(tz="UTC")
+        for field in _TIMESTAMP_FIELDS:
+            # Naive call dates are UTC midnights, as Firestore stores them
+            frame[field] = pd.to_datetime(frame[field], errors="coerce", utc=True)
+        for field, (dtype, missing) in PROJECTION.items():
+            if field in _TIMESTAMP_FIELDS:
+                continue
+            if np.issubdtype(dtype, np.number):
+                values = pd.to_numeric(frame[field], errors="coerce")
+                frame[field] = values.fillna(missing).astype(dtype) if missing == 0 else values
+            else:
+                frame[field] = frame[field].map(lambda v: None if v is None else str(v)).astype(object)
+        points = pd.to_numeric(frame[GRAPH_POINTS_FIELD], errors="coerce")
+        frame[GRAPH_POINTS_FIELD] = points.fillna(0).astype(np.int64)
+
+        table = pa.Table.from_pandas(frame, schema=_local_schema(), preserve_index=False)
+        self.calls_dir.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+        path = self.calls_dir / f"part-{stamp}-{uuid.uuid4().hex[:8]}.parquet"
+        # Written aside and renamed in, so readers never see half a file
+        tmp_path = self.calls_dir / f".{path.name}.tmp"
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, path)
+        return len(frame)
+
+
+def _local_schema():
+    import pyarrow as pa
+
+    types = {
+        np.float64: pa.float64(),
+        np.int64: pa.int64(),
+    }
+    fields = []
+    for field, (dtype, _) in PROJECTION.items():
+        if field in _TIMESTAMP_FIELDS:
+            fields.append(pa.field(field, pa.timestamp("us", tz="UTC")))
+        else:
+            fields.append(pa.field(field, types.get(dtype, pa.string())))
+    fields.append(pa.field(GRAPH_FIELD, pa.binary()))
+    fields.append(pa.field(GRAPH_POINTS_FIELD, pa.int64()))
+    return pa.schema(fields)
+
+
+def _empty_calls() -> pd.DataFrame:
+    frame = pd.DataFrame({
+        field: pd.Series([], dtype=dtype) for field, (dtype, _) in PROJECTION.items()
+    })
+    for field in _TIMESTAMP_FIELDS:
+        frame[field] = pd.to_datetime(frame[field], utc=True)
+    return frame
+
+
+def _sql_value(value):
+    # DuckDB takes datetimes, not pandas Timestamps, as parameters
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    return value
+
+
+def source_from_secrets(secrets):
+    """
+    LocalSource when the secrets have [local_data] path = "...", else
+    Firestore with the [firebase] service account, reading call buckets
+    when call_buckets = true.
+    """
+    local = secrets.get("local_data")
+    if local and local.get("path"):
+        return LocalSource(local["path"])
+    return FirestoreSource.from_secrets(secrets["firebase"], buckets=secrets.get("call_buckets", False))
+
+
+# --- FILLING A LOCAL DIRECTORY ---
+
+def _write_chunked(source: LocalSource, payloads) -> int:
+    written = 0
+    chunk = []
+    for payload in payloads:
+        chunk.append(payload)
+        if len(chunk) >= LOCAL_FILE_ROWS:
+            written += source.write_calls(chunk)
+            chunk = []
+            print(f"✅ Wrote {written} calls...")
+    return written + source.write_calls(chunk)
+
+
+def import_zip(zip_path, source: LocalSource) -> int:
+    """
+    Write every valid call JSON in an export ZIP, as the uploader would
+    upload it.
+    """
+    from upload_jsons_to_firestore import build_payload, call_members, is_valid_json
+
+    skipped = []
+
+    def payloads(z):
+        for name in call_members(z, skipped):
+            valid, result = is_valid_json(z.read(name))
+            if valid:
+                yield build_payload(result, Path(name).stem)
+            else:
+                skipped.append((Path(name).name, result))
+
+    with zipfile.ZipFile(zip_path, "r") as z:
+        written = _write_chunked(source, payloads(z))
+    if skipped:
+        print(f"⚠️ Skipped {len(skipped)} files, e.g. {skipped[0][0]}: {skipped[0][1]}")
+    return written
+
+
+def import_firestore(client, source: LocalSource, page_size: int = 1000) -> int:
+    """
+    Copy every call in Firestore, emotion graphs included.
+    """
+    fields = [f for f in PROJECTION if f != "ingested_at"] + [GRAPH_FIELD, GRAPH_POINTS_FIELD]
+    base = client.collection(collection_name).order_by("__name__").select(fields)
+
+    def payloads():
+        last_doc = None
+        while True:
+            query = base.start_after(last_doc) if last_doc else base
+            batch = list(query.limit(page_size).stream())
+            if not batch:
+                return
+            for d in batch:
+                yield d.to_dict()
+            last_doc = batch[-1]
+
+    return _write_chunked(source, payloads())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    from_zip = commands.add_parser("from-zip", help="import an export ZIP of call JSONs")
+    from_zip.add_argument("zip_path", type=Path)
+    from_zip.add_argument("path", type=Path, help="local data directory")
+    from_firestore = commands.add_parser("from-firestore", help="copy every call from Firestore")
+    from_firestore.add_argument("path", type=Path, help="local data directory")
+    from_firestore.add_argument("--key", default=firebase_key_path, help="service account JSON")
+    args = parser.parse_args()
+
+    source = LocalSource(args.path)
+    if args.command == "from-zip":
+        written = import_zip(args.zip_path, source)
+    else:
+        import firebase_admin
+        from firebase_admin import credentials, firestore
+
+        if not firebase_admin._apps:
+            firebase_admin.initialize_app(credentials.Certificate(args.key))
+        written = import_firestore(firestore.client(), source)
+    print(f"🎉 Wrote {written} calls to {source.calls_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Parsing of the "MM:SS" speaking times in call JSONs into seconds.
+
+The uploader stores the results on each call (call_duration_s and
+speaking_seconds_per_speaker) so the dashboard never has to parse them;
+backfill_durations.py does the same for documents uploaded before that.
+"""
+import re
+
+import pandas as pd
+
+MMSS_PATTERN = r"^\s*(\d+):(\d+)\s*$"
+_mmss = re.compile(MMSS_PATTERN)
+
+
+def speaker_seconds(speaking_times) -> dict:
+    """
+    {speaker: seconds} for one call's speaking_time_per_speaker map.
+    Values that aren't "MM:SS" strings are left out.
+    """
+    if not isinstance(speaking_times, dict):
+        return {}
+    seconds = {}
+    for speaker, t in speaking_times.items():
+        match = _mmss.match(t) if isinstance(t, str) else None
+        if match:
+            seconds[speaker] = int(match[1]) * 60 + int(match[2])
+    return seconds
+
+
+def call_duration(speaking_times):
+    """
+    Total speaking seconds for one call, or None without a speaking map.
+    """
+    if not isinstance(speaking_times, dict):
+        return None
+    return sum(speaker_seconds(speaking_times).values())
+
+
+def parse_mmss(values: pd.Series) -> pd.Series:
+    """
+    Vectorized "MM:SS" → seconds; anything else becomes NaN.
+    """
+    strings = values.where(values.map(type) == str).astype("string")
+    parts = strings.str.extract(MMSS_PATTERN)
+    return parts[0].astype(float) * 60 + parts[1].astype(float)
+
+
+def call_durations(speaking_maps: pd.Series) -> pd.Series:
+    """
+    Vectorized call_duration over a Series of speaking_time_per_speaker maps:
+    all times are flattened and parsed in one pass, then summed per call.
+    """
+    has_map = speaking_maps.map(lambda m: isinstance(m, dict))
+    flat = [(idx, t) for idx, speaking in speaking_maps[has_map].items() for t in speaking.values()]
+    totals = pd.Series(0.0, index=speaking_maps.index).where(has_map)
+    if flat:
+        index, times = zip(*flat)
+        seconds = parse_mmss(pd.Series(times, index=index, dtype=object))
+        totals = totals.add(seconds.groupby(level=0).sum(), fill_value=0).where(has_map)
+    return totals
@@ -0,0 +1,87 @@
+"""
+Per-call emotion_graph time series: packed storage and downsampling.
+
+The uploader packs each call's x/y points into one little-endian float32
+blob (all x values, then all y values) stored on the call document, so a
+long call costs 8 bytes per point instead of a Firestore map per point. The
+dashboard reads one blob for its drilldown view and downsamples it with
+LTTB (Largest-Triangle-Three-Buckets) to a fixed point budget before
+plotting, which keeps the peaks and dips a plain stride would drop.
+"""
+import numpy as np
+
+GRAPH_FIELD = "emotion_graph_f32"
+GRAPH_POINTS_FIELD = "emotion_graph_points"
+
+# Firestore caps documents at 1 MiB; longer series are downsampled to this
+# many points at upload time (800 KB packed)
+MAX_STORED_POINTS = 100_000
+
+_DTYPE = np.dtype("<f4")
+
+
+def series_arrays(points):
+    """
+    x/y arrays from an emotion_graph list of {"x": ..., "y": ...} entries,
+    skipping malformed ones and sorted by x. None if nothing usable.
+    """
+    if not isinstance(points, list):
+        return None
+    pairs = []
+    for p in points:
+        if not isinstance(p, dict):
+            continue
+        try:
+            pairs.append((float(p["x"]), float(p["y"])))
+        except (KeyError, TypeError, ValueError):
+            continue
+    if not pairs:
+        return None
+    xy = np.asarray(pairs, dtype=np.float64)
+    xy = xy[np.argsort(xy[:, 0], kind="stable")]
+    return xy[:, 0], xy[:, 1]
+
+
+def pack_series(x, y) -> bytes:
+    x, y = lttb(np.asarray(x), np.asarray(y), MAX_STORED_POINTS)
+    return np.concatenate([x, y]).astype(_DTYPE).tobytes()
+
+
+def unpack_series(blob: bytes):
+    values = np.frombuffer(blob, dtype=_DTYPE)
+    n = len(values) // 2
+    return values[:n], values[n:]
+
+
+def lttb(x, y, threshold: int):
+    """
+    Downsample to `threshold` points with Largest-Triangle-Three-Buckets.
+
+    Keeps the first and last points; from each bucket in between keeps the
+    point forming the largest triangle with the previously kept point and
+    the average of the next bucket. Series already within budget come back
+    unchanged.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return x, y
+
+    every = (n - 2) / (threshold - 2)
+    kept = np.empty(threshold, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        # The last bucket's "next bucket" is just the final point
+        next_end = max(min(int((i + 2) * every) + 1, n), end + 1)
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(area.argmax())
+        kept[i + 1] = a
+    return x[kept], y[kept]
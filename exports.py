@@ -0,0 +1,109 @@
+"""
+Excel and PDF report builders for the dashboard's download buttons.
+
+Both return bytes so the dashboard can build them only when a download is
+requested and cache the result per data version and filter selection.
+
+Charts come in as (PNG bytes, title) pairs, the same images the dashboard
+shows (see chart_cache.py): they're embedded as they are rather than drawn
+again.
+"""
+import io
+import json
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+from matplotlib.backends.backend_pdf import PdfPages
+from matplotlib.figure import Figure
+from pandas import ExcelWriter
+from PIL import Image
+from xlsxwriter.utility import xl_rowcol_to_cell
+
+
+def _clean(val):
+    # nested objects → JSON text
+    if isinstance(val, (dict, list)):
+        return json.dumps(val)
+    # timezone-aware datetimes → drop tzinfo
+    if isinstance(val, datetime) and val.tzinfo is not None:
+        # convert to UTC then drop tz
+        return val.astimezone(timezone.utc).replace(tzinfo=None)
+    return val
+
+
+def export_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Make a frame Excel-safe: Excel has no timezones and can't hold nested
+    objects. Typed columns are converted whole; only object columns, which
+    may hold anything, are cleaned cell by cell.
+    """
+    export_df = df.copy()
+    for col in export_df.columns:
+        series = export_df[col]
+        if isinstance(series.dtype, pd.DatetimeTZDtype):
+            export_df[col] = series.dt.tz_convert("UTC").dt.tz_localize(None)
+        elif series.dtype == object:
+            export_df[col] = series.map(_clean)
+    return export_df
+
+
+def build_excel(filtered_df: pd.DataFrame, summary_df: pd.DataFrame, charts) -> bytes:
+    excel_buffer = io.BytesIO()
+    with ExcelWriter(excel_buffer, engine="xlsxwriter") as writer:
+        export_frame(filtered_df).to_excel(writer, sheet_name="Call Metadata", index=False)
+        summary_df.to_excel(writer, sheet_name="Summary", index=False)
+
+        # Charts sheet
+        workbook = writer.book
+        worksheet = workbook.add_worksheet("Charts")
+        writer.sheets["Charts"] = worksheet
+
+        def insert_plot(png, cell):
+            # Sized from the PNG's own DPI, so charts keep their size in inches
+            worksheet.insert_image(cell, "", {"image_data": io.BytesIO(png)})
+
+        # Insert all charts in 2-column layout
+        for idx, (png, _) in enumerate(charts):
+            row = (idx % 2) * 25  # 0 or 25 depending on odd/even
+            col = (idx // 2) * 8  # every two figures, move right
+            if col >= 16384:
+                raise ValueError("Too many columns for Excel")  # Excel supports up to XFD (~16K)
+            cell = xl_rowcol_to_cell(row + 1, col)
+            insert_plot(png, cell)
+    return excel_buffer.getvalue()
+
+
+# Page furniture around each chart image, in inches
+PDF_TITLE_IN = 0.6
+PDF_FOOTER_IN = 0.4
+
+
+def build_pdf(charts) -> bytes:
+    pdf_buffer = io.BytesIO()
+    with PdfPages(pdf_buffer) as pdf:
+        for idx, (png, title) in enumerate(charts, start=1):
+            with Image.open(io.BytesIO(png)) as img:
+                dpi = img.info.get("dpi", (100, 100))[0]
+                pixels = np.asarray(img)
+            width = pixels.shape[1] / dpi
+            height = pixels.shape[0] / dpi
+            page_height = height + PDF_TITLE_IN + PDF_FOOTER_IN
+
+            # A page sized to the chart, which fills it between title and footer
+            fig = Figure(figsize=(width, page_height))
+            ax = fig.add_axes([0, PDF_FOOTER_IN / page_height, 1, height / page_height])
+            # interpolation="none" embeds the pixels as they are
+            ax.imshow(pixels, interpolation="none")
+            ax.axis("off")
+            fig.suptitle(title, fontsize=14, y=1 - PDF_TITLE_IN / 2 / page_height, va="center")
+
+            # --- Add footer text manually ---
+            footer_text = f"Generated by Valence Dashboard • © 2025"
+            page_number = f"Page {idx}"
+            footer_y = PDF_FOOTER_IN / 2 / page_height
+            fig.text(0.5, footer_y, footer_text, ha='center', va='center', fontsize=8, color='gray')
+            fig.text(0.98, footer_y, page_number, ha='right', va='center', fontsize=8, color='gray')
+
+            pdf.savefig(fig)
+    return pdf_buffer.getvalue()
@@ -0,0 +1,140 @@
+"""
+Lightweight per-stage timing for the dashboard.
+
+A RunTimer collects the spans of one script run (loading, filtering, each
+chart...). The process-wide PerfLog appends every finished run, and every
+span timed outside a run (background refreshes, exports built on
+download), to a JSON-lines log. It also keeps per-stage histograms, dumped
+in the Prometheus text format for scraping or a quick look.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Upper bounds (seconds) of the histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+METRIC_NAME = "dashboard_stage_seconds"
+
+
+class RunTimer:
+    """
+    Spans of one script run, in the order they finished.
+    """
+
+    def __init__(self):
+        self.spans = []
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def span(self, stage: str, **attrs):
+        started = time.perf_counter()
+        try:
+            yield attrs
+        finally:
+            self.spans.append({"stage": stage, "seconds": time.perf_counter() - started, **attrs})
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+
+class PerfLog:
+
+    def __init__(self, log_path=None, metrics_path=None, metrics_interval: float = 15):
+        self.log_path = Path(log_path) if log_path else None
+        self.metrics_path = Path(metrics_path) if metrics_path else None
+        self.metrics_interval = metrics_interval
+        self._histograms = {}    # stage → [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+        # Held while checking and rewriting the metrics file, so two threads
+        # never both write (and rename) the one temp file
+        self._dump_lock = threading.Lock()
+        self._metrics_written = 0.0
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            hist = self._histograms.setdefault(stage, [0] * len(BUCKETS) + [0.0, 0])
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    hist[i] += 1
+            hist[-2] += seconds
+            hist[-1] += 1
+
+    def record(self, stage: str, seconds: float, **attrs):
+        """
+        Log a span timed outside a script run.
+        """
+        self.observe(stage, seconds)
+        self._append({"kind": "span", "stage": stage, "seconds": round(seconds, 6), **attrs})
+        self._maybe_dump_metrics()
+
+    @contextmanager
+    def span(self, stage: str, **attrs):
+        started = time.perf_counter()
+        try:
+            yield attrs
+        finally:
+            self.record(stage, time.perf_counter() - started, **attrs)
+
+    def finish_run(self, run: RunTimer, **context):
+        """
+        Log a script run's spans as one record.
+        """
+        for span in run.spans:
+            self.observe(span["stage"], span["seconds"])
+        self._append({
+            "kind": "run",
+            "seconds": round(run.elapsed(), 6),
+            **context,
+            "spans": [{**s, "seconds": round(s["seconds"], 6)} for s in run.spans],
+        })
+        self._maybe_dump_metrics()
+
+    def summary(self) -> list:
+        """
+        [(stage, count, mean seconds)] over everything observed so far.
+        """
+        with self._lock:
+            return [
+                (stage, hist[-1], hist[-2] / hist[-1])
+                for stage, hist in sorted(self._histograms.items()) if hist[-1]
+            ]
+
+    def prometheus_text(self) -> str:
+        lines = [
+            f"# HELP {METRIC_NAME} Time spent in each dashboard stage.",
+            f"# TYPE {METRIC_NAME} histogram",
+        ]
+        with self._lock:
+            for stage, hist in sorted(self._histograms.items()):
+                label = stage.replace("\\", "\\\\").replace('"', '\\"')
+                for bound, count in zip(BUCKETS, hist):
+                    lines.append(f'{METRIC_NAME}_bucket{{stage="{label}",le="{bound}"}} {count}')
+                lines.append(f'{METRIC_NAME}_bucket{{stage="{label}",le="+Inf"}} {hist[-1]}')
+                lines.append(f'{METRIC_NAME}_sum{{stage="{label}"}} {hist[-2]:.6f}')
+                lines.append(f'{METRIC_NAME}_count{{stage="{label}"}} {hist[-1]}')
+        return "\n".join(lines) + "\n"
+
+    def _append(self, record: dict):
+        if self.log_path is None:
+            return
+        record = {"ts": datetime.now(timezone.utc).isoformat(), **record}
+        line = json.dumps(record, default=str) + "\n"
+        with self._lock:
+            with open(self.log_path, "a") as f:
+                f.write(line)
+
+    def _maybe_dump_metrics(self):
+        # Rewritten at most every metrics_interval seconds, not per event
+        if self.metrics_path is None:
+            return
+        with self._dump_lock:
+            if time.time() - self._metrics_written < self.metrics_interval:
+                return
+            self._metrics_written = time.time()
+            tmp_path = self.metrics_path.with_name(self.metrics_path.name + ".tmp")
+            tmp_path.write_text(self.prometheus_text())
+            os.replace(tmp_path, self.metrics_path)
@@ -0,0 +1,62 @@
+"""
+Decides when a sidebar selection is narrow enough to answer straight from
+Firestore, so a cold server doesn't make "Last 7 Days" wait on the whole
+call history. Once the full table is in memory the dashboard filters that
+instead and these queries aren't issued at all.
+
+The pushed-down queries need the composite indexes in firestore.indexes.json.
+"""
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta, timezone
+
+import pandas as pd
+
+from call_store import normalize_calls
+
+# Wider ranges read most of the collection anyway; load it all instead
+MAX_PUSHDOWN_DAYS = 31
+# Firestore's limit on values in an 'in' filter
+MAX_IN_VALUES = 30
+
+
+@dataclass(frozen=True)
+class CallQuery:
+    start: date
+    end: date
+    companies: tuple = ()   # empty means every company
+
+    def filters(self):
+        # call_date is stored as a UTC timestamp at midnight of the call day
+        lower = datetime.combine(self.start, time.min, tzinfo=timezone.utc)
+        upper = datetime.combine(self.end + timedelta(days=1), time.min, tzinfo=timezone.utc)
+        filters = [("call_date", ">=", lower), ("call_date", "<", upper)]
+        if self.companies:
+            filters.append(("company", "in", list(self.companies)))
+        return filters
+
+
+def plan_query(start, end, companies=None, warm: bool = False):
+    """
+    Return a CallQuery for the selection, or None when it should be served
+    from the full in-memory table (already warm, unbounded or too wide).
+    """
+    if warm or start is None or end is None:
+        return None
+    if (end - start).days > MAX_PUSHDOWN_DAYS:
+        return None
+    if companies and len(companies) <= MAX_IN_VALUES:
+        companies = tuple(sorted(companies))
+    else:
+        companies = ()
+    return CallQuery(start, end, companies)
+
+
+def fetch_planned(source, query: CallQuery, page_size: int = 1000) -> pd.DataFrame:
+    """
+    Run a planned query and normalize it like the full table.
+
+    Calls with no stored call_date (dated only by Date Raw) can't be matched
+    by the range predicate and only show up once the full table is loaded.
+    """
+    frame = source.fetch_calls(filters=query.filters(), order_by="call_date", page_size=page_size)
+    return normalize_calls(frame)
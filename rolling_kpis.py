@@ -0,0 +1,112 @@
+"""
+Calendar-window rolling KPIs per company, kept up to date incrementally.
+
+The engine holds one dense row of daily totals per company (every calendar
+day from the first call to the last, empty days as zeros) and their running
+sums. A window of N days ending on day t is then the difference of two
+running sums, so the whole rolling series costs O(days), whatever the
+window or the number of calls behind it. When new data arrives, only the
+running sums from the first changed day onwards are recomputed.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+WINDOWS = [7, 14, 30]
+
+# Daily totals the KPIs are built from, in the order they're stored
+KPI_SUMS = ["calls", "happiness_sum", "happiness_count"]
+
+
+class RollingKPIs:
+
+    def __init__(self, companies, agents):
+        self.companies = list(companies)
+        self.agents = list(agents)
+        self.version = None
+        self.first_day = None     # numpy datetime64[D] of daily[:, 0]
+        self.daily = None         # (companies, days, KPI_SUMS)
+        self.cumulative = None    # (companies, days + 1, KPI_SUMS), leading zeros
+        self._lock = threading.Lock()
+
+    def update(self, rollups: pd.DataFrame, version):
+        """
+        Bring the engine up to `version` of the rollups. Days whose totals
+        didn't change keep their running sums; nothing happens if the
+        version is the one already loaded.
+        """
+        with self._lock:
+            if version == self.version:
+                return
+            first_day, daily = self._daily_totals(rollups)
+            if self.daily is None or first_day != self.first_day:
+                changed = 0
+            else:
+                changed = _first_difference(self.daily, daily)
+
+            if changed is not None:
+                cumulative = np.zeros((daily.shape[0], daily.shape[1] + 1, daily.shape[2]))
+                if changed:
+                    cumulative[:, :changed + 1] = self.cumulative[:, :changed + 1]
+                cumulative[:, changed + 1:] = (
+                    cumulative[:, changed:changed + 1] + np.cumsum(daily[:, changed:], axis=1)
+                )
+                self.first_day, self.daily, self.cumulative = first_day, daily, cumulative
+            self.version = version
+
+    def _daily_totals(self, rollups):
+        selected = rollups[rollups["Company"].isin(self.companies) & rollups["Agent"].isin(self.agents)]
+        sums = selected.groupby(["Company", "Day"], observed=True)[KPI_SUMS].sum().reset_index()
+
+        days = sums["Day"].values.astype("datetime64[D]")
+        if not len(days):
+            return None, np.zeros((len(self.companies), 0, len(KPI_SUMS)))
+        first_day = days.min()
+        offsets = (days - first_day).astype(np.int64)
+        rows = pd.Index(self.companies).get_indexer(sums["Company"])
+
+        daily = np.zeros((len(self.companies), offsets.max() + 1, len(KPI_SUMS)))
+        np.add.at(daily, (rows, offsets), sums[KPI_SUMS].to_numpy(dtype=np.float64))
+        return first_day, daily
+
+    def rolling_happiness(self, window_days: int, start, end) -> pd.DataFrame:
+        """
+        Happiness % over the `window_days` calendar days ending on each day
+        from `start` to `end`, one column per company with calls in range.
+        Windows at the start of the range reach back before it.
+        """
+        with self._lock:
+            first_day, cumulative = self.first_day, self.cumulative
+        if first_day is None:
+            return pd.DataFrame()
+
+        n_days = cumulative.shape[1] - 1
+        lo = max(int((np.datetime64(start, "D") - first_day).astype(np.int64)), 0)
+        hi = min(int((np.datetime64(end, "D") - first_day).astype(np.int64)), n_days - 1)
+        if hi < lo:
+            return pd.DataFrame()
+
+        ends = np.arange(lo, hi + 1) + 1
+        window = cumulative[:, ends] - cumulative[:, np.maximum(ends - window_days, 0)]
+        happiness_sum = window[..., KPI_SUMS.index("happiness_sum")]
+        happiness_count = window[..., KPI_SUMS.index("happiness_count")]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            happiness = np.where(happiness_count > 0, happiness_sum / happiness_count, np.nan)
+
+        index = pd.DatetimeIndex(first_day + np.arange(lo, hi + 1), name="Day")
+        frame = pd.DataFrame(happiness.T, index=index, columns=self.companies)
+        return frame.dropna(axis=1, how="all")
+
+
+def _first_difference(old, new):
+    """
+    First day index where two daily arrays differ, or None if identical.
+    """
+    common = min(old.shape[1], new.shape[1])
+    differs = (old[:, :common] != new[:, :common]).any(axis=(0, 2))
+    if differs.any():
+        return int(differs.argmax())
+    if old.shape[1] != new.shape[1]:
+        return common
+    return None
@@ -0,0 +1,180 @@
+"""
+Daily call rollups keyed by company × agent × day × time of day.
+
+The dashboard builds its aggregate charts from rollups, so chart cost
+scales with days × agents instead of total calls. It builds them once per
+version of its call table, from the calls it already holds, rather than
+re-reading `call_rollups`: there are nearly half as many rollups as calls.
+upload_jsons_to_firestore.py keeps that collection current for every
+company-day it touches, for anything else that reads aggregates.
+
+Run this module directly to rebuild every rollup from the calls collection.
+"""
+from datetime import datetime, time, timedelta, timezone
+
+import pandas as pd
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+from bulk_writes import bulk_write
+from call_store import EMOTIONS, fetch_calls, normalize_calls
+
+rollup_collection = "call_rollups"
+firebase_key_path = "/Users/Chloe/Downloads/valence-acsi-dashboard-firebase-adminsdk-fbsvc-e8065d1b80.json"
+
+ROLLUP_KEYS = ["Company", "Agent", "Day", "Call Time"]
+ROLLUP_SUMS = [
+    "calls",
+    "happiness_sum", "happiness_count",
+    "duration_s_sum", "duration_count",
+    "low_confidences_sum",
+    *EMOTIONS,
+]
+# Frame column → Firestore field
+FIELD_NAMES = {"Company": "company", "Agent": "agent", "Day": "day", "Call Time": "time"}
+
+
+def build_rollups(calls: pd.DataFrame) -> pd.DataFrame:
+    """
+    Roll a normalized call frame up to one row per ROLLUP_KEYS combination.
+
+    Means are stored as sum + count pairs so rollups can be re-aggregated
+    along any subset of the keys.
+    """
+    # Summed in float64, whatever the call table stores them as
+    happiness = pd.to_numeric(calls["Avg Happiness %"], errors="coerce").astype(float)
+    duration = pd.to_numeric(calls["Call Duration (s)"], errors="coerce").astype(float)
+    work = pd.DataFrame({
+        "Company":             calls["Company"],
+        "Agent":               calls["Agent"],
+        "Day":                 calls["Call Date"].dt.floor("D"),
+        "Call Time":           calls["Call Time"],
+        "calls":               1,
+        "happiness_sum":       happiness.fillna(0),
+        "happiness_count":     happiness.notna().astype(int),
+        "duration_s_sum":      duration.fillna(0),
+        "duration_count":      duration.notna().astype(int),
+        "low_confidences_sum": pd.to_numeric(calls["Low Confidences"], errors="coerce").astype(float).fillna(0),
+    })
+    for emotion in EMOTIONS:
+        work[emotion] = calls[emotion]
+    return work.groupby(ROLLUP_KEYS, as_index=False, observed=True)[ROLLUP_SUMS].sum()
+
+
+def aggregate(rollups: pd.DataFrame, by) -> pd.DataFrame:
+    """
+    Re-aggregate rollups along `by`, turning sum/count pairs back into
+    the dashboard's averages.
+    """
+    g = rollups.groupby(by, observed=True)[ROLLUP_SUMS].sum()
+    out = pd.DataFrame(index=g.index)
+    out["Total Calls"] = g["calls"]
+    out["Avg Happiness %"] = g["happiness_sum"] / g["happiness_count"]
+    out["Avg Call Duration (min)"] = g["duration_s_sum"] / g["duration_count"] / 60
+    out["Low Confidences"] = g["low_confidences_sum"]
+    for emotion in EMOTIONS:
+        out[emotion] = g[emotion]
+    return out
+
+
+def filter_rollups(rollups: pd.DataFrame, start, end, companies, agents) -> pd.DataFrame:
+    days = rollups["Day"].dt.date
+    return rollups[
+        rollups["Company"].isin(companies) &
+        rollups["Agent"].isin(agents) &
+        (days >= start) &
+        (days <= end)
+    ]
+
+
+def _document_id(row) -> str:
+    # '/' would be read as a path separator in a document ID
+    parts = [row["Company"], row["Agent"], row["Day"].strftime("%Y%m%d"), row["Call Time"]]
+    return "|".join(str(p).replace("/", "_") for p in parts)
+
+
+def rollup_documents(rollups: pd.DataFrame) -> dict:
+    """
+    {document_id: payload} for writing rollups to Firestore.
+    """
+    docs = {}
+    for row in rollups.to_dict("records"):
+        payload = {FIELD_NAMES.get(k, k): v for k, v in row.items()}
+        payload["day"] = row["Day"].to_pydatetime()
+        docs[_document_id(row)] = payload
+    return docs
+
+
+def fetch_rollups(client) -> pd.DataFrame:
+    """
+    Read the whole rollup collection into a frame with ROLLUP_KEYS columns.
+    """
+    records = [d.to_dict() for d in client.collection(rollup_collection).stream()]
+    if not records:
+        return pd.DataFrame(columns=ROLLUP_KEYS + ROLLUP_SUMS)
+    df = pd.DataFrame(records).rename(columns={v: k for k, v in FIELD_NAMES.items()})
+    df["Day"] = pd.to_datetime(df["Day"], utc=True)
+    return df[ROLLUP_KEYS + ROLLUP_SUMS]
+
+
+def _write(client, docs: dict, stale_ids=()):
+    coll = client.collection(rollup_collection)
+    writes = [(doc_id, coll.document(doc_id), payload) for doc_id, payload in docs.items()]
+    writes += [(doc_id, coll.document(doc_id), None) for doc_id in stale_ids]
+    failures = bulk_write(client, writes)
+    if failures:
+        raise RuntimeError(f"{len(failures)} rollup writes failed, e.g. {failures[0][0]}: {failures[0][1]}")
+
+
+def refresh_rollups(client, company_days, on_day=None) -> int:
+    """
+    Recompute the rollups of each (company, date) pair from its calls and
+    replace whatever was stored for it. Returns the number of rollups written.
+
+    `on_day(company, day, calls)`, if given, is called with each day's calls
+    as fetched, so other per-day documents (see call_buckets.py) can be
+    rebuilt from the same reads.
+    """
+    coll = client.collection(rollup_collection)
+    written = 0
+    for company, day in sorted(company_days):
+        lower = datetime.combine(day, time.min, tzinfo=timezone.utc)
+        upper = lower + timedelta(days=1)
+        calls = fetch_calls(client, filters=[
+            ("company", "==", company),
+            ("call_date", ">=", lower),
+            ("call_date", "<", upper),
+        ])
+        if on_day is not None:
+            on_day(company, day, calls)
+        docs = rollup_documents(build_rollups(normalize_calls(calls))) if len(calls) else {}
+
+        existing = (
+            coll.where(filter=FieldFilter("company", "==", company))
+            .where(filter=FieldFilter("day", "==", lower))
+            .select([])
+            .stream()
+        )
+        stale_ids = [d.id for d in existing if d.id not in docs]
+        _write(client, docs, stale_ids)
+        written += len(docs)
+    return written
+
+
+def rebuild_all_rollups(client) -> int:
+    """
+    Rebuild the rollup collection from scratch out of every call.
+    """
+    docs = rollup_documents(build_rollups(normalize_calls(fetch_calls(client))))
+    existing = client.collection(rollup_collection).select([]).stream()
+    stale_ids = [d.id for d in existing if d.id not in docs]
+    _write(client, docs, stale_ids)
+    return len(docs)
+
+
+if __name__ == "__main__":
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
+    if not firebase_admin._apps:
+        firebase_admin.initialize_app(credentials.Certificate(firebase_key_path))
+    print(f"✅ Rebuilt {rebuild_all_rollups(firestore.client())} rollups.")
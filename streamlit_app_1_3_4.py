@@ -1,64 +1,141 @@
 import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-import io
 from datetime import datetime, timedelta, date
-from pandas import ExcelWriter
-from matplotlib.backends.backend_pdf import PdfPages
 import streamlit_authenticator as stauth
-import firebase_admin
-from firebase_admin import credentials, firestore
-import json
-from xlsxwriter.utility import xl_rowcol_to_cell
+import os
 import time
+# The dashboard's own modules (pandas, matplotlib, seaborn, Firestore...)
+# are imported after the login guard, so the login page doesn't wait on them
+
+# Delta syncs are cheap (only new/changed docs), so refresh more often than
+# the old one-hour full rescan.
+SYNC_INTERVAL_S = 300
+
+# Memory budget for rendered charts kept across reruns and sessions
+CHART_CACHE_MB = 256
+# Processes rendering charts in parallel (each holds its own matplotlib)
+RENDER_WORKERS = min(4, os.cpu_count() or 1)
+
+# Points per emotion graph sent to the browser, however long the call
+GRAPH_POINT_BUDGET = 1000
+# Most recent calls offered in the drilldown picker (any ID can be typed)
+DRILLDOWN_OPTIONS = 1000
+
+# Per-stage timings: one JSON line per run (and per background sync or
+# export build), plus a Prometheus text dump of the per-stage histograms
+PERF_LOG_PATH = "perf_log.jsonl"
+PERF_METRICS_PATH = "perf_metrics.prom"
+
+@st.cache_resource
+def get_data_source():
+    """
+    Firestore, or local Parquet files when the secrets have a [local_data]
+    path (see data_sources.py).
+    """
+    return source_from_secrets(st.secrets)
 
-# Build Firebase credentials from secrets
-firebase_creds = {
-    "type": st.secrets["firebase"]["type"],
-    "project_id": st.secrets["firebase"]["project_id"],
-    "private_key_id": st.secrets["firebase"]["private_key_id"],
-    "private_key": st.secrets["firebase"]["private_key"].replace('\\n', '\n'),
-    "client_email": st.secrets["firebase"]["client_email"],
-    "client_id": st.secrets["firebase"]["client_id"],
-    "auth_uri": st.secrets["firebase"]["auth_uri"],
-    "token_uri": st.secrets["firebase"]["token_uri"],
-    "auth_provider_x509_cert_url": st.secrets["firebase"]["auth_provider_x509_cert_url"],
-    "client_x509_cert_url": st.secrets["firebase"]["client_x509_cert_url"]
-}
+@st.cache_data(ttl=SYNC_INTERVAL_S, show_spinner=False)
+def load_planned_calls(query):
+    """
+    Per-range results for pushed-down queries, shared across sessions.
+    """
+    return fetch_planned(get_data_source(), query, page_size=1000)
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def load_rollups(cache_key, _calls):
+    """
+    Daily rollups for one version of the calls, shared across sessions and
+    rebuilt only when the data changes (from the calls in memory, or with a
+    GROUP BY for a local source). `cache_key` identifies the data so `_calls`
+    needn't be hashed.
+    """
+    return get_data_source().fetch_rollups(_calls)
+
+@st.cache_data(ttl=SYNC_INTERVAL_S, max_entries=256, show_spinner=False)
+def load_emotion_graph(call_id, points):
+    """
+    One call's emotion graph, downsampled server-side to `points` points,
+    and how many points it had. None if the call has no stored graph.
+    Expires with the sync interval so a re-uploaded graph shows up.
+    """
+    blob = get_data_source().emotion_graph(call_id)
+    if not blob:
+        return None
+    x, y = unpack_series(blob)
+    total = len(x)
+    x, y = lttb(x, y, points)
+    return pd.DataFrame({"Time (s)": x, "Happiness": y}), total
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def excel_report(cache_key, _filtered_df, _summary_df, _charts):
+    """
+    Excel bytes for one view, shared by every session showing it.
+    `cache_key` pins down the data version and filters behind the inputs.
+    """
+    # xlsxwriter and the PDF backend only load when someone downloads
+    from exports import build_excel
 
-cred = credentials.Certificate(firebase_creds)
+    with get_perf_log().span("excel", rows=len(_filtered_df), charts=len(_charts)):
+        return build_excel(_filtered_df, _summary_df, _charts)
 
-# Initialize Firebase app
-if not firebase_admin._apps:
-    firebase_admin.initialize_app(cred)
+@st.cache_data(max_entries=32, show_spinner=False)
+def pdf_report(cache_key, _charts):
+    from exports import build_pdf
+
+    with get_perf_log().span("pdf", charts=len(_charts)):
+        return build_pdf(_charts)
+
+@st.cache_resource(max_entries=4)
+def get_call_index(data_version, _frame):
+    """
+    Filter index for one version of the call table, shared across sessions.
+    """
+    return CallIndex(_frame)
+
+@st.cache_resource(max_entries=32)
+def get_rolling_kpis(companies, agents):
+    """
+    Rolling KPI engine for one company/agent selection, shared across
+    sessions and brought up to date in place when the data changes.
+    """
+    return RollingKPIs(companies, agents)
+
+@st.cache_resource
+def get_chart_cache():
+    """
+    Rendered charts shared by every session in this server process, and
+    the worker pool that renders them.
+    """
+    return ChartCache(max_bytes=CHART_CACHE_MB << 20, executor=render_pool(RENDER_WORKERS))
+
+@st.cache_resource
+def get_perf_log():
+    """
+    Stage timings from every session and the background refresher.
+    """
+    return PerfLog(PERF_LOG_PATH, PERF_METRICS_PATH)
 
-@st.cache_data(ttl=3600)
-def load_all_calls(page_size: int = 1000):
+@st.cache_resource
+def get_call_store():
     """
-    Paginate through 'calls' in Firestore 1,000 docs at a time,
-    assemble into a single list, and cache the result for 1h.
+    One CallStore per server process; sessions share its frame and it keeps
+    the high-water mark between refreshes. Starts from the on-disk snapshot
+    when there is one, so a restart doesn't wait on Firestore, and refreshes
+    on its own thread from then on, so no session ever waits on a reload.
     """
-    client = firestore.client()            # uses your default credentials
-    coll = client.collection("calls")
-    all_calls = []
-    last_doc = None
-
-    while True:
-        query = coll.order_by("call_date")
-        if last_doc:
-            query = query.start_after(last_doc)
-        batch = list(query.limit(page_size).stream())
-        if not batch:
-            break
-        # accumulate and advance cursor
-        all_calls.extend(d.to_dict() for d in batch)
-        last_doc = batch[-1]
-
-    return all_calls
-
-# Connect to Firestore
-db = firestore.client()
+    source = get_data_source()
+    # Local Parquet loads about as fast as a snapshot would
+    snapshot_path = SNAPSHOT_PATH if isinstance(source, FirestoreSource) else None
+    store = CallStore(source, page_size=1000, snapshot_path=snapshot_path, timer=get_perf_log())
+    store.load_snapshot()
+    store.start_refresher(SYNC_INTERVAL_S)
+    return store
+
+def format_age(seconds):
+    if seconds < 60:
+        return "just now"
+    if seconds < 3600:
+        return f"{int(seconds // 60)} min ago"
+    return f"{seconds / 3600:.1f} h ago"
 
 st.set_page_config(page_title="Emotion Dashboard", layout="wide")
 
@@ -66,75 +143,6 @@ credentials = st.secrets["credentials"].to_dict()
 cookie = st.secrets["cookie"]
 auto_hash = st.secrets.get("auto_hash", False)
 
-# --- Fetch Call Metadata ---
-with st.spinner("⏳ Loading call data…"):
-    t0 = time.time()
-    call_data = load_all_calls(page_size=1000)
-    elapsed = time.time() - t0
-
-st.success(f"✅ Loaded {len(call_data)} calls in {elapsed:.2f}s")
-meta_df = pd.DataFrame(call_data)
-
-# --- Normalize raw fields into your canonical names: ---
-
-meta_df.rename(columns={
-    "company":        "Company",
-    "agent":          "Agent",
-    "call_date":      "Call Date",
-    "date_raw":       "Date Raw",   # MMDDYYYY
-    "time":           "Call Time",
-    "call_id":        "Call ID",
-    "low_confidences":"Low Confidences"
-}, inplace=True)
-
-# First, if all Call Dates are missing, try parsing Date Raw
-if ("Call Date" not in meta_df.columns) or meta_df["Call Date"].isna().all():
-    if "Date Raw" in meta_df.columns:
-        meta_df["Call Date"] = pd.to_datetime(
-            meta_df["Date Raw"],
-            format="%m%d%Y",
-            errors="coerce"
-        )
-    else:
-        st.sidebar.error("❌ Neither Call Date nor Date Raw found—cannot parse any dates.")
-        st.stop()
-
-# Now, drop anything still unparseable in one go
-before = len(meta_df)
-
-# — identify any calls still missing a date —
-missing = meta_df[meta_df["Call Date"].isna()]
-meta_df.dropna(subset=["Call Date"], inplace=True)
-dropped = before - len(meta_df)
-
-#if dropped:
-#    st.sidebar.warning(f"⚠️ Dropped {dropped} calls with no valid date.")
-
-# Fix: Create Avg Happiness % directly from average_happiness_value
-meta_df["Avg Happiness %"] = meta_df["average_happiness_value"]
-
-# --- Recompute "Call Duration (s)" if missing ---
-if "Call Duration (s)" not in meta_df.columns:
-    if "speaking_time_per_speaker" in meta_df.columns:
-        def compute_speaking_time(row):
-            speaking_times = row["speaking_time_per_speaker"]
-            if isinstance(speaking_times, dict):
-                total = 0
-                for t in speaking_times.values():
-                    if isinstance(t, str) and ":" in t:
-                        try:
-                            minutes, seconds = map(int, t.split(":"))
-                            total += minutes * 60 + seconds
-                        except:
-                            pass
-                return total
-            return None
-
-        meta_df["Call Duration (s)"] = meta_df.apply(compute_speaking_time, axis=1)
-    else:
-        meta_df["Call Duration (s)"] = None
-
-
 authenticator = stauth.Authenticate(
     credentials,
     cookie["name"],
@@ -158,70 +166,114 @@ if auth_status is False:
 
 st.sidebar.success(f"Welcome, {st.session_state.get('name')} 👋")
 
-# --- Sidebar Section Toggles ---
-st.sidebar.header("Display Options")
-show_summary = st.sidebar.checkbox("📋 Show Summary Table", value=True)
-show_leaderboard = st.sidebar.checkbox("🏆 Show Agent Leaderboard", value=True)
-show_agent = st.sidebar.checkbox("📊 Show Happiness by Agent", value=True)
-show_rolling = st.sidebar.checkbox("📈 Show Rolling Happiness", value=True)
-show_emotion_by_company = st.sidebar.checkbox("🎯 Show Emotion Distribution by Company", value=True)
-show_avg_by_time = st.sidebar.checkbox("📌 Show Happiness by Time of Day", value=True)
-show_duration_vs_happiness = st.sidebar.checkbox("📍 Show Call Duration vs. Avg Happiness", value=True)
-show_confidence = st.sidebar.checkbox("📈 Show Happiness vs. Confidence", value=True)
-show_emotion_by_agent = st.sidebar.checkbox("🧊 Emotion Proportion by Agent", value=True)
-show_duration_by_company = st.sidebar.checkbox("📶 Show Call Duration by Company", value=True)
-show_volume = st.sidebar.checkbox("📞 Show Call Volume by Agent", value=True)
-
-company_colors = {
-    "Quantum": "#1f77b4",
-    "StVincent": "#ff7f0e",
-    "ABCMotors": "#2ca02c"
-}
+# --- Dashboard modules ---
+import pandas as pd
+from call_index import CallIndex
+from call_store import CallStore, SNAPSHOT_PATH
+from chart_cache import ChartCache, render_png, render_pool
+from charts import CHARTS, agent_leaderboard, chart_inputs, company_colors
+from data_sources import FirestoreSource, source_from_secrets
+from emotion_series import lttb, unpack_series
+from perf import PerfLog, RunTimer
+from query_planner import fetch_planned, plan_query
+from rolling_kpis import WINDOWS, RollingKPIs
+from rollups import filter_rollups
 
-for emotion in ["happy", "angry", "sad", "neutral"]:
-    if emotion not in meta_df.columns:
-        meta_df[emotion] = 0
+# --- Fetch Call Metadata ---
+# Only for logged-in sessions; the first one starts the background loads
+store = get_call_store()
 
-meta_df["Total Emotions"] = meta_df[["happy", "angry", "sad", "neutral"]].sum(axis=1)
+# Delta syncs never see deleted documents; a full resync repairs that
+if st.sidebar.button("🔄 Full Resync", help="Re-read every call from the data source"):
+    store.request_full_resync()
+    st.sidebar.info("🔄 Resyncing in the background; the current data stays up until it's done.")
 
-# --- Prepare Metadata ---
-meta_df["Call Duration (min)"] = meta_df["Call Duration (s)"] / 60
-meta_df["Total Emotions"] = meta_df[["happy", "angry", "sad", "neutral"]].sum(axis=1)
-meta_df["Avg Happiness %"] = (meta_df["happy"] / meta_df["Total Emotions"]) * 100
+# --- Sidebar Display Options ---
+# Each section's own "Show" toggle sits next to it (see Sections below)
+st.sidebar.header("Display Options")
+show_perf = st.sidebar.checkbox("⏱️ Show Performance Panel", value=False)
 
 # --- Sidebar Filters ---
 st.sidebar.header("📊 Filter Data")
-min_date = meta_df["Call Date"].min()
-max_date = meta_df["Call Date"].max()
-
-companies = meta_df["Company"].dropna().unique().tolist()
-available_agents = meta_df[meta_df["Company"].isin(companies)]["Agent"].dropna().unique().tolist()
-dates = meta_df["Call Date"].dropna().sort_values().dt.date.unique().tolist()
-
-if not dates:
-    st.warning("⚠️ No calls with valid dates to display. Check your data or filters.")
-    st.stop()
-
 preset_option = st.sidebar.selectbox(
     "📆 Date Range Presets",
     options=["All Time", "This Week", "Last 7 Days", "Last 30 Days", "Custom"],
     index=0
 )
 
-selected_dates = (min(dates), max(dates))
+today = datetime.today().date()
+preset_ranges = {
+    "This Week": (today - timedelta(days=today.weekday()), today),
+    "Last 7 Days": (today - timedelta(days=7), today),
+    "Last 30 Days": (today - timedelta(days=30), today),
+}
+
+# Timings of this run's stages, logged once the page is complete
+perf_log = get_perf_log()
+run = RunTimer()
+
+# --- Resolve the call table for this selection ---
+# One version of the table for the whole run; the refresher may swap in a
+# newer one meanwhile, which the next rerun picks up
+with run.span("load") as load_span:
+    table = store.current
+    query = plan_query(
+        *preset_ranges.get(preset_option, (None, None)),
+        companies=st.session_state.get("selected_companies"),
+        warm=table is not None,
+    )
+    load_span["planned"] = query is not None
+    if query is not None:
+        # Full table still loading: answer the bounded range from Firestore
+        with st.spinner("⏳ Loading calls for the selected range…"):
+            meta_df = load_planned_calls(query)
+    else:
+        if table is None:
+            with st.spinner("⏳ Loading call data…"):
+                store.wait()
+            table = store.current
+        if table is None:
+            st.sidebar.error(f"❌ Couldn't load calls: {store.last_error}")
+            st.stop()
+        # Shared across sessions: treat as read-only
+        meta_df = table.frame
+st.success(f"✅ Loaded {len(meta_df)} calls in {run.spans[-1]['seconds']:.2f}s")
+
+if table is not None:
+    if table.synced_at is None:
+        synced = "from snapshot, refreshing…"
+    else:
+        synced = f"synced {format_age(time.time() - table.synced_at)}"
+    st.sidebar.caption(f"🗂️ Data version {table.version} · {synced}")
+    if store.last_error is not None:
+        st.sidebar.warning(f"⚠️ Last refresh failed, showing older data: {store.last_error}")
+
+# Identifies what's on screen, for caching derived artifacts across sessions
+data_version = (table.version if query is None else None, query)
+with run.span("index"):
+    index = get_call_index(data_version, meta_df)
+
+min_date = index.first_day
+max_date = index.last_day
+
+companies = index.companies.tolist()
+if query is not None:
+    # A partial table may not hold every company; keep the others selectable
+    companies += [c for c in [*company_colors, *query.companies] if c not in companies]
+
+if min_date is None:
+    st.warning("⚠️ No calls with valid dates to display. Check your data or filters.")
+    st.stop()
+
+selected_dates = (min_date, max_date)
 
 if preset_option != "Custom":
-    today = datetime.today().date()
     if preset_option == "All Time":
-        selected_dates = (min(dates), max(dates))
-    elif preset_option == "This Week":
-        selected_dates = (today - timedelta(days=today.weekday()), today)
-    elif preset_option == "Last 7 Days":
-        selected_dates = (today - timedelta(days=7), today)
-    elif preset_option == "Last 30 Days":
-        selected_dates = (today - timedelta(days=30), today)
+        selected_dates = (min_date, max_date)
+    else:
+        selected_dates = preset_ranges[preset_option]
 else:
-    custom_input = st.sidebar.date_input("Select Date Range", value=(min(dates), max(dates)))
+    custom_input = st.sidebar.date_input("Select Date Range", value=(min_date, max_date))
 
     # Normalize into exactly (start_date, end_date)
     if isinstance(custom_input, tuple):
@@ -237,8 +289,10 @@ else:
         st.stop()
 
 # Multiselect filters
-selected_companies = st.sidebar.multiselect("Select Companies", companies, default=companies)
-available_agents = meta_df[meta_df["Company"].isin(selected_companies)]["Agent"].dropna().unique().tolist()
+selected_companies = st.sidebar.multiselect(
+    "Select Companies", companies, default=companies, key="selected_companies"
+)
+available_agents = index.agents_for(selected_companies)
 selected_agents = st.sidebar.multiselect("Select Agents", available_agents, default=available_agents)
 
 # Ensure both values in selected_dates are proper `date` objects
@@ -253,64 +307,176 @@ else:
 
 start, end = selected_dates
 
-# Filter the DataFrame
-filtered_df = meta_df[
-    (meta_df["Company"].isin(selected_companies)) &
-    (meta_df["Agent"].isin(selected_agents)) &
-    (meta_df["Call Date"].dt.date >= start) &
-    (meta_df["Call Date"].dt.date <= end)
-].copy()
+filter_signature = (start, end, tuple(sorted(selected_companies)), tuple(sorted(selected_agents)))
+
+# Filter the DataFrame: a read-only view, shared with the cached index
+with run.span("filter") as filter_span:
+    filtered_df = index.select(start, end, selected_companies, selected_agents)
+    filter_span["rows"] = len(filtered_df)
 
 if filtered_df.empty:
     st.warning("⚠️ No data matches the current filter selection. Please adjust your filters.")
     st.stop()
 
-# --- Create Figures ---
-figures = []
-summary_df = pd.DataFrame()
+# Aggregate charts read the daily rollups rather than grouping raw calls
+with run.span("rollups"):
+    rollup_df = load_rollups(data_version, meta_df)
+    filtered_rollups = filter_rollups(rollup_df, start, end, selected_companies, selected_agents)
+# The rollups are built from the same version of the calls
+chart_version = data_version
+
+# --- Sections ---
+# Every section below is a fragment: its own widgets (its "Show" toggle, the
+# rolling window, the drilldown picker) rerun just that section. Only the
+# sidebar filters rerun the whole page, and the work that doesn't depend on
+# them (the call store, the index, the rollups) is cached across reruns.
+charts = get_chart_cache()
+
+# What the page currently shows, kept up to date by the sections as they
+# rerun. The download buttons read it when clicked (see Downloads below).
+page = {
+    "summary": pd.DataFrame(),
+    "charts": {},    # chart id → (cache key, future PNG)
+}
+rendering = set()    # charts that missed the cache and haven't been shown yet
+
+
+def stage_span(stage, **attrs):
+    """
+    A span of this page run or, once the run has been logged, of a section
+    rerunning on its own, which is logged by itself.
+    """
+    return (run or perf_log).span(stage, **attrs)
+
+
+def chart_job(chart_id, window_days):
+    """
+    The render job for a chart that isn't cached: render_png and the
+    inputs it's sent, cut down to what the chart reads.
+    """
+    if chart_id == "rolling_happiness":
+        # Calendar windows over every day, not just the selected ones
+        kpis = get_rolling_kpis(filter_signature[2], filter_signature[3])
+        kpis.update(rollup_df, chart_version)
+        return render_png, chart_id, kpis.rolling_happiness(window_days, start, end), window_days
+    return render_png, chart_id, *chart_inputs(chart_id, filtered_df, filtered_rollups)
+
+
+def request_chart(chart_id):
+    """
+    Ask the chart cache for a chart and mark it as on the page.
+    """
+    # The rolling chart has one version per window over the same data
+    window_days = st.session_state.get("rolling_window", WINDOWS[0])
+    variant = window_days if chart_id == "rolling_happiness" else None
+    key = (chart_id, variant, filter_signature, chart_version)
+
+    def prepare():
+        rendering.add(chart_id)
+        return chart_job(chart_id, window_days)
+
+    future = charts.request(key, prepare)
+    page["charts"][chart_id] = (key, future)
+    return future
+
+
+def show_chart(chart_id):
+    future = request_chart(chart_id)
+    with stage_span(f"chart:{chart_id}", cached=chart_id not in rendering):
+        st.image(future.result(), width="stretch")
+    rendering.discard(chart_id)
+
+
+def section_toggle(section):
+    shown = st.toggle("Show", value=True, key=f"show_{section}")
+    if not shown:
+        page["charts"].pop(section, None)
+    return shown
+
 
-# --- Summary Table ---
-if show_summary:
+# Start every shown chart at once, so they render in parallel while the
+# rest of the page is built; each section then waits for its own. A chart's
+# toggle is drawn further down, but session state holds its value already.
+for chart_id in CHARTS:
+    if st.session_state.get(f"show_{chart_id}", True):
+        request_chart(chart_id)
+
+
+@st.fragment
+def summary_section():
     st.subheader("📋 Summary Metrics")
-    summary_data = {
-        "Total Calls": [len(filtered_df)],
-        "Unique Agents": [filtered_df["Agent"].nunique()],
-        "Unique Companies": [filtered_df["Company"].nunique()],
-        "Avg Call Duration (min)": [filtered_df["Call Duration (min)"].mean()],
-        "Avg Happiness %": [filtered_df["Avg Happiness %"].mean()],
-    }
-    summary_df = pd.DataFrame(summary_data)
-    st.dataframe(summary_df, use_container_width=True)
-
-# --- Leaderboard ---
-if show_leaderboard:
+    if not section_toggle("summary"):
+        page["summary"] = pd.DataFrame()
+        return
+    with stage_span("summary"):
+        summary_data = {
+            "Total Calls": [len(filtered_df)],
+            "Unique Agents": [filtered_df["Agent"].nunique()],
+            "Unique Companies": [filtered_df["Company"].nunique()],
+            "Avg Call Duration (min)": [filtered_df["Call Duration (min)"].mean()],
+            "Avg Happiness %": [filtered_df["Avg Happiness %"].mean()],
+        }
+        page["summary"] = pd.DataFrame(summary_data)
+        st.dataframe(page["summary"], use_container_width=True)
+
+
+@st.fragment
+def leaderboard_section():
     st.subheader("🏆 Agent Leaderboard")
-    agent_summary = (
-        filtered_df
-        .groupby("Agent")
-        .agg(
-            Total_Calls=("Call ID", "count"),
-            Avg_Happiness_Percent=("Avg Happiness %", "mean"),
-            Avg_Call_Duration_Min=("Call Duration (min)", "mean")
-        )
-        .reset_index()
-        .sort_values(by="Avg_Happiness_Percent", ascending=False)
+    if not section_toggle("leaderboard"):
+        return
+    with stage_span("leaderboard"):
+        agent_summary = agent_leaderboard(filtered_rollups)
+        st.dataframe(agent_summary, use_container_width=True)
+    # Its table figure is for the downloads only
+    request_chart("leaderboard")
+
+
+@st.fragment
+def chart_section(chart_id, title):
+    st.subheader(title)
+    if section_toggle(chart_id):
+        show_chart(chart_id)
+
+
+@st.fragment
+def rolling_section():
+    st.subheader("📈 Rolling Happiness per Company")
+    if not section_toggle("rolling_happiness"):
+        return
+    st.radio(
+        "Rolling window", WINDOWS, format_func=lambda d: f"{d} days", horizontal=True, key="rolling_window"
     )
+    show_chart("rolling_happiness")
+
+
+@st.fragment
+def drilldown_section():
+    st.subheader("🔎 Call Drilldown")
+    if not section_toggle("drilldown"):
+        return
+    # Latest first; the frame is in call-date order
+    recent_calls = filtered_df["Call ID"].iloc[::-1].head(DRILLDOWN_OPTIONS).tolist()
+    call_id = st.selectbox(
+        "Call ID",
+        recent_calls,
+        index=None,
+        placeholder="Pick a recent call or type any call ID",
+        accept_new_options=True,
+    )
+    if call_id:
+        with stage_span("drilldown"):
+            graph = load_emotion_graph(call_id, GRAPH_POINT_BUDGET)
+        if graph is None:
+            st.info("ℹ️ No emotion graph stored for this call. Re-upload its JSON to add one.")
+        else:
+            graph_df, total_points = graph
+            st.line_chart(graph_df, x="Time (s)", y="Happiness")
+            st.caption(f"Showing {len(graph_df):,} of {total_points:,} points")
 
-    agent_summary = agent_summary.copy()
-
-    st.dataframe(agent_summary, use_container_width=True)
 
-    fig_leaderboard, ax = plt.subplots(figsize=(10, 6))
-    ax.axis('tight')
-    ax.axis('off')
-    table_data = agent_summary.round(1)
-    table = ax.table(cellText=table_data.values, colLabels=table_data.columns, loc='center')
-    table.auto_set_font_size(False)
-    table.set_fontsize(10)
-    table.auto_set_column_width(col=list(range(len(agent_summary.columns))))
-    figures.append((fig_leaderboard, "Agent Leaderboard"))
-    plt.close(fig_leaderboard)
+summary_section()
+leaderboard_section()
 
 col4, col5 = st.columns(2)
 col6, col7 = st.columns(2)
@@ -318,192 +484,101 @@ col8, col9 = st.columns(2)
 col10, col11 = st.columns(2)
 
 with col4:
-    if show_agent:
-        st.subheader("📊 Average Happiness by Agent")
-        fig1, ax1 = plt.subplots(figsize=(10, 5))
-        filtered_df.groupby("Agent")["Avg Happiness %"].mean().sort_values().plot(kind="barh", ax=ax1, color="teal")
-        ax1.set_xlabel("Avg Happiness (%)")
-        st.pyplot(fig1)
-        figures.append((fig1, "Average Happiness by Agent"))
+    chart_section("happiness_by_agent", "📊 Average Happiness by Agent")
 
 with col5:
-    if show_rolling:
-        st.subheader("📈 Rolling Happiness per Company (7-day)")
-        filtered_df["Total Emotions"] = filtered_df[["happy", "angry", "sad", "neutral"]].sum(axis=1)
-        filtered_df["Happy %"] = filtered_df["happy"] / filtered_df["Total Emotions"] * 100
-        company_roll = filtered_df.groupby(["Call Date", "Company"])["Happy %"].mean().unstack()
-        company_roll = company_roll.rolling(window=7, min_periods=1).mean()
-        fig2, ax2 = plt.subplots(figsize=(10, 4))
-        for company in company_roll.columns:
-            ax2.plot(company_roll.index, company_roll[company], label=company, color=company_colors.get(company))
-        ax2.set_ylabel("Rolling Happiness %")
-        ax2.set_xlabel("Date")
-        ax2.legend()
-        st.pyplot(fig2)
-        figures.append((fig2, "Rolling Happiness per Company"))
+    rolling_section()
 
 with col6:
-    if show_emotion_by_company:
-        st.subheader("🎯 Emotion Distribution by Company")
-        fig3, ax3 = plt.subplots(figsize=(10, 6))
-        emo_totals = filtered_df.groupby("Company")[["happy", "angry", "sad", "neutral"]].sum()
-        emo_totals.plot(kind="bar", ax=ax3, color=["green", "red", "blue", "orange"])
-        ax3.set_ylabel("Emotion Count")
-        ax3.set_xlabel("Company")
-        ax3.legend(title="Emotion")
-        st.pyplot(fig3)
-        figures.append((fig3, "Emotion Distribution by Company"))
+    chart_section("emotion_by_company", "🎯 Emotion Distribution by Company")
 
 with col7:
-    if show_avg_by_time:
-        st.subheader("📌 Average Happiness by Time of Day")
-        fig4, ax4 = plt.subplots(figsize=(10, 6))
-        filtered_df.groupby("Call Time")["Avg Happiness %"].mean().plot(kind="bar", ax=ax4, color="orange")
-        ax4.set_xlabel("Call Time")
-        ax4.set_ylabel("Avg Happiness (%)")
-        st.pyplot(fig4)
-        figures.append((fig4, "Happiness by Time of Day"))
+    chart_section("happiness_by_time", "📌 Average Happiness by Time of Day")
 
 with col8:
-    if show_duration_vs_happiness:
-        st.subheader("📍 Call Duration vs. Avg Happiness")
-        fig5, ax5 = plt.subplots(figsize=(8, 5))
-        sns.scatterplot(data=filtered_df, x="Call Duration (min)", y="Avg Happiness %", hue="Company",
-                        palette=company_colors, ax=ax5)
-        ax5.set_xlabel("Call Duration (min)")
-        ax5.set_ylabel("Avg Happiness (%)")
-        st.pyplot(fig5)
-        figures.append((fig5, "Duration vs Happiness"))
+    chart_section("duration_vs_happiness", "📍 Call Duration vs. Avg Happiness")
 
 with col9:
-    if show_confidence:
-        st.subheader("📈 Happiness vs. Low Confidence")
-        fig6, ax6 = plt.subplots(figsize=(8, 5))
-        sns.scatterplot(data=filtered_df, x="Low Confidences", y="Avg Happiness %", hue="Company",
-                        palette=company_colors, ax=ax6)
-        ax6.set_xlabel("Low Confidence (%)")
-        ax6.set_ylabel("Avg Happiness (%)")
-        st.pyplot(fig6)
-        figures.append((fig6, "Happiness vs Low Confidence"))
+    chart_section("happiness_vs_confidence", "📈 Happiness vs. Low Confidence")
 
 with col10:
-    if show_emotion_by_agent:
-        st.subheader("🧊 Emotion Proportion by Agent")
-        emotion_pivot = filtered_df.groupby("Agent")[["happy", "angry", "sad", "neutral"]].sum()
-        emotion_pivot_percent = emotion_pivot.div(emotion_pivot.sum(axis=1), axis=0) * 100
-        fig7, ax7 = plt.subplots(figsize=(10, 6))
-        emotion_pivot_percent.plot(kind='bar', stacked=True, ax=ax7, color=["green", "red", "blue", "orange"])
-        ax7.set_ylabel("Emotion %")
-        ax7.set_xlabel("Agent")
-        st.pyplot(fig7)
-        figures.append((fig7, "Emotion Proportion by Agent"))
+    chart_section("emotion_by_agent", "🧊 Emotion Proportion by Agent")
 
 with col11:
-    if show_duration_by_company:
-        st.subheader("📶 Avg Call Duration by Company")
-        fig8, ax8 = plt.subplots(figsize=(8, 4))
-        avg_dur = filtered_df.groupby("Company")["Call Duration (min)"].mean()
-        colors = [company_colors.get(c, "gray") for c in avg_dur.index]
-        avg_dur.plot(kind="bar", ax=ax8, color=colors)
-        ax8.set_ylabel("Avg Duration (min)")
-        ax8.set_xlabel("Company")
-        st.pyplot(fig8)
-        figures.append((fig8, "Avg Call Duration by Company"))
-
-if show_volume:
-    st.subheader("📞 Call Volume per Agent per Day")
-    call_volume = filtered_df.groupby(["Call Date", "Agent", "Company"]).size().reset_index(name="Call Count")
-    facet = sns.FacetGrid(call_volume, col="Company", col_wrap=2, height=4, sharey=False)
-    facet.map_dataframe(sns.lineplot, x="Call Date", y="Call Count", hue="Agent")
-    facet.add_legend()
-    facet.set_titles("{col_name}")
-
-    # Rotate x-axis labels to avoid overlap
-    for ax in facet.axes.flat:
-        for label in ax.get_xticklabels():
-            label.set_rotation(45)
-            label.set_horizontalalignment('right')
-
-    st.pyplot(facet.fig)
-    figures.append((facet.fig, "Call Volume per Agent per Day"))
-
-# --- Create Excel in memory ---
-excel_buffer = io.BytesIO()
-with ExcelWriter(excel_buffer, engine="xlsxwriter") as writer:
-    # === Prepare a copy for export, converting the dict column to JSON text ===
-    export_df = filtered_df.copy()
-
-    # Clean every cell: JSON-encode dicts/lists, strip tz from datetimes
-    from datetime import datetime, timezone
-    def _clean(val):
-        # nested objects → JSON text
-        if isinstance(val, (dict, list)):
-            return json.dumps(val)
-        # timezone-aware datetimes → drop tzinfo
-        if isinstance(val, datetime) and val.tzinfo is not None:
-            # convert to UTC then drop tz
-            val = val.astimezone(timezone.utc).replace(tzinfo=None)
-            return val
-        return val
-
-    for col in export_df.columns:
-        export_df[col] = export_df[col].map(_clean)
-
-    # Now write export_df instead of filtered_df
-    export_df.to_excel(writer, sheet_name="Call Metadata", index=False)
-    summary_df.to_excel(writer, sheet_name="Summary", index=False)
-
-    # Charts sheet
-    workbook = writer.book
-    worksheet = workbook.add_worksheet("Charts")
-    writer.sheets["Charts"] = worksheet
-
-    def insert_plot(fig, cell):
-        imgdata = io.BytesIO()
-        fig.savefig(imgdata, format='png', dpi=150, bbox_inches="tight")
-        imgdata.seek(0)
-        worksheet.insert_image(cell, "", {"image_data": imgdata})
-
-    # Insert all figures in 2-column layout
-    for idx, (fig, _) in enumerate(figures):
-        row = (idx % 2) * 25  # 0 or 25 depending on odd/even
-        col = (idx // 2) * 8  # every two figures, move right
-        if col >= 16384:
-            raise ValueError("Too many columns for Excel")  # Excel supports up to XFD (~16K)
-        cell = xl_rowcol_to_cell(row + 1, col)
-        insert_plot(fig, cell)
-
-# --- Download Buttons ---
+    chart_section("duration_by_company", "📶 Avg Call Duration by Company")
+
+chart_section("call_volume", "📞 Call Volume per Agent per Day")
+
+# --- Per-call emotion graph ---
+drilldown_section()
+
+# --- Downloads: built on click, cached per data version and filter selection ---
+def export_inputs():
+    """
+    Cache key and (PNG, title) pairs for the downloads: the same PNGs as
+    the sections show, as they show them at the time of the click.
+    """
+    on_page = [(chart_id, *page["charts"][chart_id]) for chart_id in CHARTS if chart_id in page["charts"]]
+    key = (
+        chart_version,
+        filter_signature,
+        not page["summary"].empty,
+        tuple(chart_key for _, chart_key, _ in on_page),
+    )
+    return key, [(future.result(), CHARTS[chart_id][0]) for chart_id, _, future in on_page]
+
+
+def excel_download():
+    key, exported_charts = export_inputs()
+    return excel_report(key, filtered_df, page["summary"], exported_charts)
+
+
+def pdf_download():
+    key, exported_charts = export_inputs()
+    return pdf_report(key, exported_charts)
+
+
 st.download_button(
     label="📥 Download Raw Data (Excel)",
-    data=excel_buffer.getvalue(),
+    data=excel_download,
     file_name=f"call_report_{selected_dates[0]}_to_{selected_dates[1]}.xlsx",
     mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
 )
 
-# Generate the PDF in memory and offer immediate download
-pdf_buffer = io.BytesIO()
-with PdfPages(pdf_buffer) as pdf:
-    for idx, (fig, title) in enumerate(figures, start=1):
-        fig.suptitle(title, fontsize=14)
-        fig.tight_layout(rect=[0, 0, 1, 0.92])  # Shrink slightly more to leave room for footer
-
-        # --- Add footer text manually ---
-        footer_text = f"Generated by Valence Dashboard • © 2025"
-        page_number = f"Page {idx}"
-
-        fig.text(0.5, 0.02, footer_text, ha='center', va='center', fontsize=8, color='gray')
-        fig.text(0.98, 0.02, page_number, ha='right', va='center', fontsize=8, color='gray')
-
-        pdf.savefig(fig, bbox_inches='tight')
-pdf_buffer.seek(0)
-
 st.download_button(
     label="📄 Export All Graphs as PDF",
-    data=pdf_buffer,
+    data=pdf_download,
     file_name="Charts.pdf",
     mime="application/pdf"
 )
 
 st.markdown("---")
 st.markdown("Built with ❤️ by [Valence](https://www.getvalenceai.com) | Pilot Dashboard © 2025")
+
+# --- Performance ---
+# Runs cut short by st.stop() (login, empty selections) aren't logged
+perf_log.finish_run(
+    run,
+    data_version=table.version if table is not None else None,
+    preset=preset_option,
+    start=start,
+    end=end,
+    companies=len(selected_companies),
+    agents=len(selected_agents),
+    rows=len(filtered_df),
+)
+
+if show_perf:
+    st.sidebar.header("⏱️ Performance")
+    st.sidebar.caption(f"This run: {run.elapsed():.2f}s · Sections rerun on their own, and Excel/PDF when downloaded, are logged separately")
+    stages_df = pd.DataFrame(run.spans)
+    stages_df["ms"] = (stages_df.pop("seconds") * 1000).round(1)
+    st.sidebar.dataframe(stages_df[["stage", "ms"] + [c for c in stages_df if c not in ("stage", "ms")]])
+
+    st.sidebar.caption("Since server start (incl. background syncs, section reruns and exports)")
+    totals_df = pd.DataFrame(perf_log.summary(), columns=["stage", "count", "mean s"])
+    totals_df["mean ms"] = (totals_df.pop("mean s") * 1000).round(1)
+    st.sidebar.dataframe(totals_df, hide_index=True)
+
+# Sections rerunning on their own come after this run was logged
+run = None
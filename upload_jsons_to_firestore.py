@@ -1,77 +1,80 @@
 import os
 import json
+import time
 import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 from pathlib import Path
 from datetime import datetime
-from dateutil import parser as date_parser  # pip install python-dateutil
 import firebase_admin
 from firebase_admin import credentials, firestore
+from bulk_writes import MAX_BATCH_OPS, bulk_write
+from call_buckets import replace_buckets
+from durations import call_duration, speaker_seconds
+from emotion_series import GRAPH_FIELD, GRAPH_POINTS_FIELD, pack_series, series_arrays
+from rollups import refresh_rollups
+from upload_manifest import CHANGED, NEW, UNCHANGED, UploadManifest, payload_hash
 
 # --- CONFIGURATION ---
 zip_path = "/Users/Chloe/Downloads/JSONsLastWeek.zip"
 firebase_key_path = "/Users/Chloe/Downloads/valence-acsi-dashboard-firebase-adminsdk-fbsvc-e8065d1b80.json"
 collection_name = "calls"
 skipped_log_path = "skipped_files.txt"
+manifest_path = "upload_manifest.sqlite"
+force_reupload = False        # True = ignore the manifest and rewrite every call
+bulk_upload = True            # False = one blocking set() per call
+batch_size = MAX_BATCH_OPS    # writes per Firestore batch (bulk_write also caps its bytes)
+max_concurrent_batches = 8    # batches in flight at once
+parse_workers = os.cpu_count() or 1
+parse_chunk_size = 32         # archive members per worker task
+# Parsed payloads held before they're flushed to Firestore; keeps memory
+# flat no matter how big the archive is
+flush_every = batch_size * max_concurrent_batches
 
-# --- INITIALIZE FIREBASE ---
-print("✅ Initializing Firebase...")
-if not firebase_admin._apps:
-    cred = credentials.Certificate(firebase_key_path)
-    firebase_admin.initialize_app(cred)
-db = firestore.client()
-
-# --- UNZIP FILES ---
-print("✅ Unzipping JSON files...")
-temp_dir = Path("/tmp/json_upload")
-if temp_dir.exists():
-    for f in temp_dir.rglob("*"):
-        if f.is_file():
-            f.unlink()
-else:
-    temp_dir.mkdir(parents=True, exist_ok=True)
-
-with zipfile.ZipFile(zip_path, "r") as z:
-    z.extractall(temp_dir)
-
-# --- VALIDATION FUNCTION ---
-def is_valid_json(filepath: Path):
-    # 1) Skip any ".mp3.json" dumps
-    if filepath.name.endswith(".mp3.json"):
-        return False, "Filename is an mp3 dump"
-
-    # 2) Must parse as JSON
-    try:
-        data = json.loads(filepath.read_text(encoding="utf-8"))
-    except Exception as e:
-        return False, f"JSON parsing error: {e}"
 
-    # 3) metadata must include agent, company, time, date
+# --- VALIDATION FUNCTIONS ---
+def validate_call(data: dict):
+    """
+    Reason the parsed call can't be uploaded, or None if it's fine.
+    """
+    # metadata must include agent, company, time, date
     metadata = data.get("metadata", {})
     for field in ("agent", "company", "time", "date"):
         if not metadata.get(field):
-            return False, f"Missing metadata field: {field}"
+            return f"Missing metadata field: {field}"
 
-    # 4) Must have an average_happiness_value
+    # Must have an average_happiness_value
     if data.get("average_happiness_value") is None:
-        return False, "Missing average_happiness_value"
+        return "Missing average_happiness_value"
+
+    return None
+
+
+def is_valid_json(raw: bytes):
+    # Must parse as JSON
+    try:
+        data = json.loads(raw.decode("utf-8"))
+    except Exception as e:
+        return False, f"JSON parsing error: {e}"
+
+    reason = validate_call(data)
+    if reason:
+        return False, reason
 
     # If we reach here, it’s valid
     return True, data
 
-# --- PROCESS & UPLOAD ---
-skipped_files = []
-uploaded_count = 0
-
-for file_path in temp_dir.rglob("*.json"):
-    valid, result = is_valid_json(file_path)
-    if not valid:
-        skipped_files.append((file_path.name, result))
-        continue
 
-    data = result
+def build_payload(data: dict, fallback_id: str) -> dict:
+    """
+    Flatten one validated call JSON into its Firestore document. The
+    ingested_at server timestamp is added by the caller: sentinels don't
+    survive being pickled back from a worker process.
+    """
     # --- Flatten metadata ---
     metadata    = data.get("metadata", {})
-    document_id = metadata.get("call_id", file_path.stem)
+    document_id = metadata.get("call_id", fallback_id)
     agent       = metadata.get("agent")
     company     = metadata.get("company")
     time_of_day = metadata.get("time")
@@ -90,11 +93,15 @@ for file_path in temp_dir.rglob("*.json"):
     neutral = ec.get("neutral", 0)
     sad     = ec.get("sad",     0)
 
-    # --- Speaking times (optional) ---
+    # --- Speaking times (optional), parsed once here for the dashboard ---
     speaking = data.get("speaking_time_per_speaker", {})
+    per_speaker_s = speaker_seconds(speaking)
+
+    # --- Emotion graph, packed as float32 for the drilldown view ---
+    series = series_arrays(data.get("emotion_graph"))
 
     # --- Build the payload ---
-    upload_payload = {
+    return {
         "call_id":                  document_id,
         "agent":                    agent,
         "company":                  company,
@@ -108,25 +115,207 @@ for file_path in temp_dir.rglob("*.json"):
         "neutral":                  neutral,
         "sad":                      sad,
         "speaking_time_per_speaker": speaking,
+        "speaking_seconds_per_speaker": per_speaker_s,
+        "call_duration_s":          call_duration(speaking),
+        GRAPH_FIELD:                pack_series(*series) if series else None,
+        GRAPH_POINTS_FIELD:         len(series[0]) if series else 0,
         # ... add other top-level fields if needed ...
     }
 
-    # --- Upload to Firestore ---
-    try:
-        db.collection(collection_name).document(document_id).set(upload_payload)
-        uploaded_count += 1
-        if uploaded_count % 100 == 0:
-            print(f"✅ Uploaded {uploaded_count} calls...")
-    except Exception as e:
-        skipped_files.append((file_path.name, f"Firestore error: {e}"))
-
-# --- LOG SKIPPED FILES ---
-if skipped_files:
-    with open(skipped_log_path, "w") as f:
-        for fn, reason in skipped_files:
-            f.write(f"{fn} — {reason}\n")
-    print(f"⚠️ Skipped {len(skipped_files)} files. Details logged to {skipped_log_path}")
-else:
-    print("✅ No skipped files.")
-
-print(f"🎉 Upload complete: {uploaded_count} calls uploaded successfully.")
+
+# --- PARSE WORKERS ---
+# Each worker opens the archive once and decompresses the members it's
+# handed, so only names go to the workers and only payloads come back.
+_worker_zip = None
+
+
+def _init_worker(path):
+    global _worker_zip
+    _worker_zip = zipfile.ZipFile(path, "r")
+
+
+def parse_members(names):
+    """
+    Returns (member path, payload, content hash) per member, or
+    (member path, None, skip reason) for invalid ones.
+    """
+    results = []
+    for name in names:
+        valid, result = is_valid_json(_worker_zip.read(name))
+        if not valid:
+            results.append((name, None, result))
+        else:
+            payload = build_payload(result, Path(name).stem)
+            results.append((name, payload, payload_hash(payload)))
+    return results
+
+
+def parse_in_pool(pool, names):
+    """
+    Yield parse results in archive order, keeping only a few chunks per
+    worker in flight (Executor.map would queue the whole archive at once).
+    """
+    names = iter(names)
+    in_flight = deque()
+    while True:
+        while len(in_flight) < parse_workers * 2:
+            chunk = list(islice(names, parse_chunk_size))
+            if not chunk:
+                break
+            in_flight.append(pool.submit(parse_members, chunk))
+        if not in_flight:
+            return
+        yield from in_flight.popleft().result()
+
+
+def call_members(z: zipfile.ZipFile, skipped_files: list):
+    """
+    Names of the call JSONs in the archive. ".mp3.json" dumps are skipped
+    by name, before anything is decompressed.
+    """
+    for info in z.infolist():
+        if info.is_dir() or not info.filename.endswith(".json"):
+            continue
+        if info.filename.endswith(".mp3.json"):
+            skipped_files.append((Path(info.filename).name, "Filename is an mp3 dump"))
+            continue
+        yield info.filename
+
+
+def main():
+    # --- INITIALIZE FIREBASE ---
+    print("✅ Initializing Firebase...")
+    if not firebase_admin._apps:
+        cred = credentials.Certificate(firebase_key_path)
+        firebase_admin.initialize_app(cred)
+    db = firestore.client()
+    coll = db.collection(collection_name)
+
+    # --- PROCESS & UPLOAD ---
+    manifest = UploadManifest(manifest_path)
+    skipped_files = []
+    uploaded_count = 0
+    counts = {NEW: 0, CHANGED: 0, UNCHANGED: 0}
+    # Keyed by the member's path in the archive: the same file name turns up
+    # in more than one day's folder
+    pending_writes = []    # (member path, doc ref, payload) for bulk mode
+    queued = {}            # member path → (call_id, content hash, company-day or None)
+    run_start = time.time()
+
+    def skip(member, reason):
+        skipped_files.append((Path(member).name, reason))
+
+    def mark_committed(members):
+        # The manifest also marks each call's previous company-day dirty, in
+        # case the re-export moved it
+        entries = []
+        for m in members:
+            call_id, content_hash, day = queued[m]
+            entries.append((call_id, content_hash, m, day))
+        manifest.mark_committed(entries)
+        for m in members:
+            del queued[m]
+
+    def flush():
+        nonlocal uploaded_count
+        committed = 0
+
+        def on_commit(members):
+            nonlocal committed
+            # Recorded per batch, so a crash resumes after the last one
+            mark_committed(members)
+            committed += len(members)
+            print(f"✅ Uploaded {uploaded_count + committed} calls...")
+
+        failures = bulk_write(
+            db,
+            pending_writes,
+            batch_size=batch_size,
+            max_workers=max_concurrent_batches,
+            on_commit=on_commit,
+        )
+        uploaded_count += committed
+        for member, reason in failures:
+            skip(member, reason)
+            del queued[member]
+        pending_writes.clear()
+
+    print("✅ Streaming JSON files from the archive...")
+    with zipfile.ZipFile(zip_path, "r") as z, \
+            ProcessPoolExecutor(parse_workers, initializer=_init_worker, initargs=(zip_path,)) as pool:
+        members = call_members(z, skipped_files)
+        for member, payload, result in parse_in_pool(pool, members):
+            if payload is None:
+                skip(member, result)
+                continue
+
+            # Skip calls whose exact payload is already in Firestore
+            content_hash = result
+            status = manifest.classify(payload["call_id"], content_hash)
+            counts[status] += 1
+            if status == UNCHANGED and not force_reupload:
+                continue
+
+            # High-water mark for the dashboard's delta sync
+            payload["ingested_at"] = firestore.SERVER_TIMESTAMP
+            day = None
+            if payload["call_date"] is not None:
+                day = (payload["company"], payload["call_date"].date())
+            queued[member] = (payload["call_id"], content_hash, day)
+            doc_ref = coll.document(payload["call_id"])
+
+            if bulk_upload:
+                pending_writes.append((member, doc_ref, payload))
+                if len(pending_writes) >= flush_every:
+                    flush()
+                continue
+
+            # --- Upload to Firestore ---
+            try:
+                doc_ref.set(payload)
+                mark_committed([member])
+                uploaded_count += 1
+                if uploaded_count % 100 == 0:
+                    print(f"✅ Uploaded {uploaded_count} calls...")
+            except Exception as e:
+                skip(member, f"Firestore error: {e}")
+                del queued[member]
+
+    if pending_writes:
+        flush()
+    elapsed = time.time() - run_start
+
+    # --- REFRESH DAILY ROLLUPS AND CALL BUCKETS ---
+    # Includes company-days left over from an earlier run that crashed
+    # before getting here
+    touched_days = manifest.dirty_days()
+    if touched_days:
+        print(f"✅ Refreshing rollups and call buckets for {len(touched_days)} company-days...")
+        bucket_count = 0
+
+        def repack(company, day, calls):
+            nonlocal bucket_count
+            bucket_count += replace_buckets(db, company, day, calls)
+
+        rollup_count = refresh_rollups(db, touched_days, on_day=repack)
+        manifest.clear_dirty_days(touched_days)
+        print(f"✅ Wrote {rollup_count} rollups and {bucket_count} call buckets.")
+    manifest.close()
+
+    # --- LOG SKIPPED FILES ---
+    if skipped_files:
+        with open(skipped_log_path, "w") as f:
+            for fn, reason in skipped_files:
+                f.write(f"{fn} — {reason}\n")
+        print(f"⚠️ Skipped {len(skipped_files)} files. Details logged to {skipped_log_path}")
+    else:
+        print("✅ No skipped files.")
+
+    print(f"🎉 Upload complete: {uploaded_count} calls uploaded successfully.")
+    print(f"📋 {counts[NEW]} new, {counts[CHANGED]} changed, {counts[UNCHANGED]} unchanged"
+          + (" (rewritten anyway)." if force_reupload else " (skipped)."))
+    print(f"⏱️ {elapsed:.1f}s to parse and upload ({uploaded_count / max(elapsed, 1e-9):.1f} docs/s).")
+
+
+if __name__ == "__main__":
+    main()
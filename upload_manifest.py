@@ -0,0 +1,116 @@
+"""
+Local SQLite record of what upload_jsons_to_firestore.py has committed.
+
+Each call is stored with the hash of the payload last confirmed in
+Firestore, so re-running on an overlapping export skips unchanged calls and
+a crashed run resumes where its last committed batch left off. Company-days
+whose rollups still need refreshing are kept too, so a crash between the
+upload and the rollup refresh doesn't lose them.
+
+Each call's company-day is recorded with it: a re-export that moves a call
+to another day or company leaves the old day's rollups and buckets counting
+it until that day is refreshed too.
+"""
+import hashlib
+import json
+import sqlite3
+import time
+from datetime import date
+
+NEW = "new"
+CHANGED = "changed"
+UNCHANGED = "unchanged"
+
+
+def _encode(value):
+    # Blobs (the packed emotion graph) are hashed rather than repr'd
+    if isinstance(value, bytes):
+        return hashlib.sha256(value).hexdigest()
+    return str(value)
+
+
+def payload_hash(payload: dict) -> str:
+    """
+    Stable content hash of a call payload (key order doesn't matter).
+    """
+    encoded = json.dumps(payload, sort_keys=True, default=_encode, ensure_ascii=False)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class UploadManifest:
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS calls (
+                call_id      TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                source       TEXT,
+                committed_at REAL NOT NULL,
+                company      TEXT,
+                day          TEXT
+            );
+            CREATE TABLE IF NOT EXISTS dirty_days (
+                company TEXT NOT NULL,
+                day     TEXT NOT NULL,
+                PRIMARY KEY (company, day)
+            );
+        """)
+        # Manifests from before company-days were recorded; their calls'
+        # old days stay unknown until they're committed again
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(calls)")}
+        with self.conn:
+            for column in ("company", "day"):
+                if column not in columns:
+                    self.conn.execute(f"ALTER TABLE calls ADD COLUMN {column} TEXT")
+
+    def classify(self, call_id: str, content_hash: str) -> str:
+        row = self.conn.execute(
+            "SELECT content_hash FROM calls WHERE call_id = ?", (call_id,)
+        ).fetchone()
+        if row is None:
+            return NEW
+        return UNCHANGED if row[0] == content_hash else CHANGED
+
+    def mark_committed(self, entries):
+        """
+        Record (call_id, content_hash, source, (company, date) or None)
+        entries as committed. The company-days they touched need a rollup
+        refresh: each call's new one, and the one it was last committed
+        under if that's different. All of it lands in one SQLite transaction.
+        """
+        now = time.time()
+        rows = []
+        days = set()
+        for call_id, content_hash, source, company_day in entries:
+            company, day = (company_day[0], company_day[1].isoformat()) if company_day else (None, None)
+            rows.append((call_id, content_hash, source, now, company, day))
+            if day is not None:
+                days.add((company, day))
+        with self.conn:
+            for call_id, *_ in rows:
+                previous = self.conn.execute(
+                    "SELECT company, day FROM calls WHERE call_id = ?", (call_id,)
+                ).fetchone()
+                if previous is not None and previous[1] is not None:
+                    days.add(previous)
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO calls (call_id, content_hash, source, committed_at, company, day) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self.conn.executemany("INSERT OR IGNORE INTO dirty_days (company, day) VALUES (?, ?)", days)
+
+    def dirty_days(self) -> set:
+        rows = self.conn.execute("SELECT company, day FROM dirty_days").fetchall()
+        return {(company, date.fromisoformat(day)) for company, day in rows}
+
+    def clear_dirty_days(self, days):
+        with self.conn:
+            self.conn.executemany(
+                "DELETE FROM dirty_days WHERE company = ? AND day = ?",
+                [(company, day.isoformat()) for company, day in days],
+            )
+
+    def close(self):
+        self.conn.close()